@@ -9,75 +9,49 @@ Features: Basic video downloading, FFmpeg conversion, simple GUI
 import tkinter as tk
 from tkinter import ttk, scrolledtext, messagebox, filedialog
 import threading
-import time
-import os
-import json
-import subprocess
-import sys
-from datetime import datetime
-from pathlib import Path
-import hashlib
-from typing import Dict, List, Optional
+from collections import deque
 
-class TikstalkSimple:
+from tikstalk_engine import TikstalkEngine, format_bytes
+
+
+class TikstalkSimple(TikstalkEngine):
+    """Tk front end; all downloading and monitoring lives in TikstalkEngine"""
+    
     def __init__(self):
         self.root = tk.Tk()
         self.root.title("Tikstalk - Simple TikTok Downloader")
-        self.root.geometry("800x700")
+        self.root.geometry("800x820")
         self.root.resizable(True, True)
         
-        # Configuration
-        self.username = "mrbeast"
-        # Set default download folder to Downloads folder next to the Python script
-        script_dir = Path(__file__).parent
-        self.download_folder = str(script_dir / "Downloads")
-        self.downloaded_videos = set()
-        self.config_file = "tikstalk_simple_config.json"
-        
-        # Monitoring configuration
-        self.is_monitoring = False
-        self.check_interval = 10  # minutes
-        self.bypass_ssl = True
-        self.monitor_thread = None
-        
-        # Video format options (simplified)
-        self.video_formats = {
-            "Best Quality": "best",
-            "Best MP4": "best[ext=mp4]/best",
-            "720p MP4": "best[height<=720][ext=mp4]/best[ext=mp4]",
-            "480p MP4": "best[height<=480][ext=mp4]/best[ext=mp4]",
-            "Audio Only": "bestaudio"
-        }
-        
-        # FFmpeg conversion options (simplified)
-        self.conversion_options = {
-            "No Conversion": None,
-            "Convert to MP4": {
-                "format": "mp4",
-                "codec": "libx264"
-            },
-            "Compress Video": {
-                "format": "mp4",
-                "codec": "libx264",
-                "crf": "28"
-            },
-            "Extract Audio (MP3)": {
-                "format": "mp3",
-                "codec": "libmp3lame"
-            }
-        }
-        
-        # Create download folder
-        Path(self.download_folder).mkdir(parents=True, exist_ok=True)
-        
-        # Load configuration
-        self.load_config()
+        # Log lines waiting for the next UI tick; old lines fall off when full
+        self.log_max_lines = 1000
+        self.log_interval_ms = 100
+        self.pending_log = deque(maxlen=self.log_max_lines)
+        
+        # Load engine state and configuration
+        super().__init__()
+        self.queue_jobs = []  # rows shown in the queue list
+        self.queue_version = -1
         
         # Setup GUI
         self.setup_gui()
+        self.root.after(self.log_interval_ms, self.ui_tick)
         
-        # Check dependencies
+        # Metrics endpoint / snapshot file, if configured
+        self.start_metrics()
+        
+        # Anything slow runs once the window is up, off the Tk thread
+        self.root.after_idle(lambda: threading.Thread(target=self.startup_tasks, daemon=True).start())
+    
+    def startup_tasks(self):
+        """Background start-up: dependency probing, history count, interrupted jobs"""
         self.check_dependencies()
+        self.update_count()
+        
+        # Pick up jobs and post-processing left unfinished by a crash or forced exit
+        self.resume_interrupted()
+        self.start_queue()
+        self.start_retention()
     
     def setup_gui(self):
         """Setup the simple GUI interface"""
@@ -86,7 +60,7 @@ class TikstalkSimple:
         
         # Configure grid weights
         main_frame.columnconfigure(1, weight=1)
-        main_frame.rowconfigure(9, weight=1)
+        main_frame.rowconfigure(10, weight=1)
         
         # Title
         title_label = ttk.Label(main_frame, text="Tikstalk - Simple TikTok Downloader", 
@@ -109,22 +83,22 @@ class TikstalkSimple:
         
         # Video quality section
         ttk.Label(main_frame, text="Video Quality:").grid(row=3, column=0, sticky=tk.W, pady=5)
-        self.quality_var = tk.StringVar(value="Best MP4")
+        self.quality_var = tk.StringVar(value=self.quality)
         quality_combo = ttk.Combobox(main_frame, textvariable=self.quality_var, 
                                    values=list(self.video_formats.keys()), state="readonly")
         quality_combo.grid(row=3, column=1, sticky=(tk.W, tk.E), pady=5, padx=(5, 0))
         
         # Conversion section
         ttk.Label(main_frame, text="Conversion:").grid(row=4, column=0, sticky=tk.W, pady=5)
-        self.conversion_var = tk.StringVar(value="No Conversion")
+        self.conversion_var = tk.StringVar(value=self.conversion)
         conversion_combo = ttk.Combobox(main_frame, textvariable=self.conversion_var,
                                       values=list(self.conversion_options.keys()), state="readonly")
         conversion_combo.grid(row=4, column=1, sticky=(tk.W, tk.E), pady=5, padx=(5, 0))
         
         # Video limit section
-        ttk.Label(main_frame, text="Video Limit:").grid(row=5, column=0, sticky=tk.W, pady=5)
-        self.limit_var = tk.StringVar(value="50")
-        limit_spin = ttk.Spinbox(main_frame, from_=1, to=500, textvariable=self.limit_var, width=10)
+        ttk.Label(main_frame, text="Video Limit (0 = all):").grid(row=5, column=0, sticky=tk.W, pady=5)
+        self.limit_var = tk.StringVar(value=str(self.limit))
+        limit_spin = ttk.Spinbox(main_frame, from_=0, to=100000, textvariable=self.limit_var, width=10)
         limit_spin.grid(row=5, column=1, sticky=tk.W, pady=5, padx=(5, 0))
         
         # Monitoring section
@@ -143,18 +117,65 @@ class TikstalkSimple:
         ssl_check = ttk.Checkbutton(monitor_frame, text="Bypass SSL verification", variable=self.ssl_bypass_var)
         ssl_check.grid(row=0, column=3, sticky=tk.W, pady=2, padx=(20, 0))
         
+        # Incremental listing option
+        self.incremental_var = tk.BooleanVar(value=self.incremental)
+        incremental_check = ttk.Checkbutton(monitor_frame, text="Only check newest videos (stop at known ones)",
+                                            variable=self.incremental_var)
+        incremental_check.grid(row=1, column=0, columnspan=4, sticky=tk.W, pady=2)
+        
+        # Additional monitored accounts
+        ttk.Label(monitor_frame, text="Also monitor (one per line, optional 'username minutes'):").grid(
+            row=2, column=0, columnspan=4, sticky=tk.W, pady=(5, 2))
+        self.accounts_text = tk.Text(monitor_frame, height=3, width=40)
+        self.accounts_text.grid(row=3, column=0, columnspan=4, sticky=(tk.W, tk.E), pady=2)
+        self.accounts_text.insert(tk.END, "\n".join(self.monitored_accounts))
+        
+        ttk.Label(monitor_frame, text="Concurrent checks:").grid(row=4, column=0, sticky=tk.W, pady=2)
+        self.max_checks_var = tk.IntVar(value=self.max_concurrent_checks)
+        checks_spin = ttk.Spinbox(monitor_frame, from_=1, to=16, textvariable=self.max_checks_var, width=5)
+        checks_spin.grid(row=4, column=1, sticky=tk.W, pady=2, padx=(5, 0))
+        
         # Options section
         options_frame = ttk.LabelFrame(main_frame, text="Download Options", padding="10")
         options_frame.grid(row=7, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0))
         
-        self.metadata_var = tk.BooleanVar(value=True)
-        metadata_check = ttk.Checkbutton(options_frame, text="Save metadata", variable=self.metadata_var)
+        self.metadata_var = tk.BooleanVar(value=self.save_metadata)
+        metadata_check = ttk.Checkbutton(options_frame, text="Save .info.json", variable=self.metadata_var)
         metadata_check.grid(row=0, column=0, sticky=tk.W, pady=2)
         
-        self.thumbnail_var = tk.BooleanVar(value=True)
+        self.thumbnail_var = tk.BooleanVar(value=self.save_thumbnails)
         thumbnail_check = ttk.Checkbutton(options_frame, text="Save thumbnails", variable=self.thumbnail_var)
         thumbnail_check.grid(row=0, column=1, sticky=tk.W, pady=2, padx=(20, 0))
         
+        self.dedup_var = tk.BooleanVar(value=self.dedup_content)
+        dedup_check = ttk.Checkbutton(options_frame, text="Link identical files", variable=self.dedup_var)
+        dedup_check.grid(row=0, column=2, sticky=tk.W, pady=2, padx=(20, 0))
+        
+        self.catalog_var = tk.BooleanVar(value=self.catalog_metadata)
+        catalog_check = ttk.Checkbutton(options_frame, text="Metadata catalog", variable=self.catalog_var)
+        catalog_check.grid(row=1, column=2, sticky=tk.W, pady=2, padx=(20, 0))
+        
+        self.compact_thumbnails_var = tk.BooleanVar(value=self.thumbnail_mode == "compact")
+        compact_check = ttk.Checkbutton(options_frame, text="Compact thumbnail cache",
+                                        variable=self.compact_thumbnails_var)
+        compact_check.grid(row=2, column=2, sticky=tk.W, pady=2, padx=(20, 0))
+        
+        ttk.Label(options_frame, text="Concurrent downloads:").grid(row=1, column=0, sticky=tk.W, pady=2)
+        self.workers_var = tk.IntVar(value=self.max_workers)
+        workers_spin = ttk.Spinbox(options_frame, from_=1, to=16, textvariable=self.workers_var, width=5)
+        workers_spin.grid(row=1, column=1, sticky=tk.W, pady=2, padx=(20, 0))
+        
+        ttk.Label(options_frame, text="yt-dlp engine:").grid(row=2, column=0, sticky=tk.W, pady=2)
+        self.backend_var = tk.StringVar(value=self.backend_name)
+        backend_combo = ttk.Combobox(options_frame, textvariable=self.backend_var,
+                                   values=list(self.backends.keys()), state="readonly", width=12)
+        backend_combo.grid(row=2, column=1, sticky=tk.W, pady=2, padx=(20, 0))
+        
+        ttk.Label(options_frame, text="Videos per yt-dlp call:").grid(row=3, column=0, sticky=tk.W, pady=2)
+        self.batch_size_var = tk.IntVar(value=self.batch_size)
+        batch_spin = ttk.Spinbox(options_frame, from_=0, to=50, textvariable=self.batch_size_var, width=5)
+        batch_spin.grid(row=3, column=1, sticky=tk.W, pady=2, padx=(20, 0))
+        
         # Control buttons
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=8, column=0, columnspan=3, pady=20)
@@ -164,7 +185,7 @@ class TikstalkSimple:
         self.download_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         self.monitor_btn = ttk.Button(button_frame, text="Start Monitoring", 
-                                    command=self.start_monitoring, style="Accent.TButton")
+                                    command=self.toggle_monitoring, style="Accent.TButton")
         self.monitor_btn.pack(side=tk.LEFT, padx=(0, 10))
         
         self.clear_btn = ttk.Button(button_frame, text="Clear Log", command=self.clear_log)
@@ -173,9 +194,23 @@ class TikstalkSimple:
         self.reset_btn = ttk.Button(button_frame, text="Reset", command=self.reset_downloads)
         self.reset_btn.pack(side=tk.LEFT)
         
+        # Job queue: running accounts first, then queued ones in the order they will run
+        queue_frame = ttk.LabelFrame(main_frame, text="Queue", padding="10")
+        queue_frame.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E))
+        queue_frame.columnconfigure(0, weight=1)
+        
+        self.queue_list = tk.Listbox(queue_frame, height=4)
+        self.queue_list.grid(row=0, column=0, rowspan=2, sticky=(tk.W, tk.E))
+        run_next_btn = ttk.Button(queue_frame, text="Run Next", command=self.run_selected_next)
+        run_next_btn.grid(row=0, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
+        cancel_btn = ttk.Button(queue_frame, text="Cancel", command=self.cancel_selected)
+        cancel_btn.grid(row=1, column=1, sticky=(tk.W, tk.E), padx=(10, 0))
+        pause_btn = ttk.Button(queue_frame, text="Pause", command=self.pause_selected)
+        pause_btn.grid(row=0, column=2, sticky=(tk.W, tk.E), padx=(10, 0))
+        
         # Status and log section
         status_frame = ttk.LabelFrame(main_frame, text="Status & Logs", padding="10")
-        status_frame.grid(row=9, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(20, 0))
+        status_frame.grid(row=10, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(20, 0))
         status_frame.columnconfigure(0, weight=1)
         status_frame.rowconfigure(1, weight=1)
         
@@ -184,21 +219,61 @@ class TikstalkSimple:
         status_label = ttk.Label(status_frame, textvariable=self.status_var)
         status_label.grid(row=0, column=0, sticky=tk.W)
         
+        self.limiter_var = tk.StringVar(value=self.rate_limiter_status())
+        limiter_label = ttk.Label(status_frame, textvariable=self.limiter_var)
+        limiter_label.grid(row=0, column=0, sticky=tk.E)
+        
         # Log area
         self.log_text = scrolledtext.ScrolledText(status_frame, height=15, width=70)
         self.log_text.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         
-        # Progress bar
-        self.progress = ttk.Progressbar(status_frame, mode='indeterminate')
+        # Progress bar, determinate while downloads report progress
+        self.progress = ttk.Progressbar(status_frame, mode='indeterminate', maximum=100)
         self.progress.grid(row=2, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
         
         # Stats
         stats_frame = ttk.Frame(status_frame)
         stats_frame.grid(row=3, column=0, sticky=(tk.W, tk.E), pady=(10, 0))
         
-        self.count_var = tk.StringVar(value=f"Downloaded: {len(self.downloaded_videos)}")
+        self.count_var = tk.StringVar(value="Downloaded: …")
         count_label = ttk.Label(stats_frame, textvariable=self.count_var)
         count_label.pack(side=tk.LEFT)
+        
+        self.avoided_var = tk.StringVar(value=f"Re-encodes avoided: {self.transcodes_avoided}")
+        avoided_label = ttk.Label(stats_frame, textvariable=self.avoided_var)
+        avoided_label.pack(side=tk.LEFT, padx=(20, 0))
+        
+        self.throughput_var = tk.StringVar(value="")
+        throughput_label = ttk.Label(stats_frame, textvariable=self.throughput_var)
+        throughput_label.pack(side=tk.RIGHT)
+    
+    def apply_settings(self) -> bool:
+        """Copy the widget values into the engine settings"""
+        try:
+            self.username = self.username_var.get().strip()
+            self.download_folder = self.folder_var.get()
+            self.quality = self.quality_var.get()
+            self.conversion = self.conversion_var.get()
+            self.limit = int(self.limit_var.get())
+            self.save_metadata = self.metadata_var.get()
+            self.catalog_metadata = self.catalog_var.get()
+            self.save_thumbnails = self.thumbnail_var.get()
+            self.thumbnail_mode = "compact" if self.compact_thumbnails_var.get() else "files"
+            self.dedup_content = self.dedup_var.get()
+            self.check_interval = self.check_interval_var.get()
+            self.bypass_ssl = self.ssl_bypass_var.get()
+            self.incremental = self.incremental_var.get()
+            self.max_workers = max(1, int(self.workers_var.get()))
+            self.backend_name = self.backend_var.get()
+            self.batch_size = max(0, int(self.batch_size_var.get()))
+            self.max_concurrent_checks = max(1, int(self.max_checks_var.get()))
+        except (ValueError, tk.TclError):
+            messagebox.showerror("Error", "Please enter whole numbers for limits, intervals and counts")
+            return False
+        
+        self.monitored_accounts = [line.strip() for line in self.accounts_text.get("1.0", tk.END).splitlines()
+                                   if line.strip()]
+        return True
     
     def browse_folder(self):
         """Browse for download folder"""
@@ -207,19 +282,101 @@ class TikstalkSimple:
             self.folder_var.set(folder)
             self.download_folder = folder
     
-    def log_message(self, message):
-        """Add message to log with timestamp"""
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        log_entry = f"[{timestamp}] {message}\n"
-        
-        # Update GUI in main thread
-        self.root.after(0, lambda: self._update_log(log_entry))
+    def show_log_line(self, log_entry):
+        """Queue a log line for the next UI tick (safe from any thread)"""
+        self.pending_log.append(log_entry)
+    
+    def ui_tick(self):
+        """Periodic UI refresh for log lines and download progress"""
+        self.drain_log()
+        self.refresh_queue()
+        self.refresh_progress()
+        self.limiter_var.set(self.rate_limiter_status())
+        self.root.after(self.log_interval_ms, self.ui_tick)
     
-    def _update_log(self, message):
-        """Update log text widget (must be called from main thread)"""
-        self.log_text.insert(tk.END, message)
-        self.log_text.see(tk.END)
-        self.root.update_idletasks()
+    def refresh_progress(self):
+        """Show aggregate download progress and throughput"""
+        snapshot = self.progress_snapshot()
+        if snapshot['done'] < snapshot['total']:
+            if str(self.progress['mode']) != 'determinate':
+                self.progress.stop()
+                self.progress.config(mode='determinate')
+            self.progress['value'] = snapshot['fraction'] * 100
+            
+            eta = f" · ETA {int(snapshot['eta'])}s" if snapshot['eta'] is not None else ""
+            self.throughput_var.set(f"{snapshot['done']}/{snapshot['total']} videos · "
+                                    f"{format_bytes(snapshot['bytes'])} · {format_bytes(snapshot['speed'])}/s{eta}")
+        elif str(self.progress['mode']) == 'determinate':
+            self.progress.config(mode='indeterminate', value=0)
+            self.throughput_var.set(f"Last batch: {format_bytes(snapshot['bytes'])}")
+            if self.is_monitoring or self.queue_jobs:
+                self.progress.start()
+    
+    def refresh_queue(self):
+        """Redraw the queue list whenever the job queue has changed"""
+        if self.job_queue.version == self.queue_version:
+            return
+        self.queue_version = self.job_queue.version
+        self.queue_jobs = self.job_queue.jobs()
+        
+        self.queue_list.delete(0, tk.END)
+        position = 0
+        for job in self.queue_jobs:
+            listing = "new videos" if job['incremental'] else "full listing"
+            if job['state'] == 'running':
+                self.queue_list.insert(tk.END, f"▶ @{job['username']} ({job['source']}, {listing})")
+            else:
+                position += 1
+                self.queue_list.insert(tk.END, f"{position}. @{job['username']} ({job['source']}, {listing})")
+        
+        # The bar keeps spinning while anything is queued or monitoring is on
+        if self.queue_jobs:
+            if str(self.progress['mode']) != 'determinate':
+                self.progress.start()
+        elif not self.is_monitoring:
+            self.progress.stop()
+    
+    def selected_job(self, state: str = 'queued'):
+        """Job in the given state selected in the list, if any"""
+        selection = self.queue_list.curselection()
+        if not selection or selection[0] >= len(self.queue_jobs):
+            return None
+        job = self.queue_jobs[selection[0]]
+        return job if job['state'] == state else None
+    
+    def run_selected_next(self):
+        """Move the selected job to the front of the queue"""
+        job = self.selected_job()
+        if job:
+            self.prioritise_job(job['id'])
+    
+    def cancel_selected(self):
+        """Cancel the selected queued job"""
+        job = self.selected_job()
+        if job:
+            self.cancel_job(job['id'])
+    
+    def pause_selected(self):
+        """Pause the selected running listing; downloading the account again resumes it"""
+        job = self.selected_job('running')
+        if job:
+            self.pause_listing(job['username'])
+    
+    def drain_log(self):
+        """Insert queued log lines in one batch, keeping only the most recent lines"""
+        lines = []
+        try:
+            while True:
+                lines.append(self.pending_log.popleft())
+        except IndexError:
+            pass
+        
+        if lines:
+            self.log_text.insert(tk.END, "".join(lines))
+            line_count = int(self.log_text.index("end-1c").split(".")[0])
+            if line_count > self.log_max_lines:
+                self.log_text.delete("1.0", f"{line_count - self.log_max_lines + 1}.0")
+            self.log_text.see(tk.END)
     
     def clear_log(self):
         """Clear the log text"""
@@ -231,334 +388,80 @@ class TikstalkSimple:
     
     def update_count(self):
         """Update downloaded count"""
-        self.root.after(0, lambda: self.count_var.set(f"Downloaded: {len(self.downloaded_videos)}"))
+        count = len(self.downloaded_videos)
+        avoided = self.transcodes_avoided
+        self.root.after(0, lambda: self.count_var.set(f"Downloaded: {count}"))
+        self.root.after(0, lambda: self.avoided_var.set(f"Re-encodes avoided: {avoided}"))
     
     def reset_downloads(self):
         """Reset downloaded videos list"""
         result = messagebox.askyesno("Reset", "Clear downloaded videos list?")
         if result:
-            self.downloaded_videos.clear()
-            self.update_count()
-            self.save_config()
-            self.log_message("Downloaded videos list cleared")
+            super().reset_downloads()
     
     def check_dependencies(self):
         """Check if required tools are installed"""
-        # Check yt-dlp
-        try:
-            result = subprocess.run(["yt-dlp", "--version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                self.log_message(f"yt-dlp found: {result.stdout.strip()}")
-            else:
-                raise FileNotFoundError
-        except FileNotFoundError:
-            self.log_message("yt-dlp not found. Installing...")
-            self.install_ytdlp()
-        
-        # Check FFmpeg
-        try:
-            result = subprocess.run(["ffmpeg", "-version"], capture_output=True, text=True)
-            if result.returncode == 0:
-                version_line = result.stdout.split('\n')[0]
-                self.log_message(f"FFmpeg found: {version_line}")
-            else:
-                raise FileNotFoundError
-        except FileNotFoundError:
-            self.log_message("FFmpeg not found. Video conversion disabled.")
-            messagebox.showwarning("FFmpeg Missing", 
-                                 "FFmpeg not installed. Video conversion features disabled.\n\n"
-                                 "To install: brew install ffmpeg")
+        found = super().check_dependencies()
+        if not found['ffmpeg']:
+            self.root.after(0, lambda: messagebox.showwarning(
+                "FFmpeg Missing",
+                "FFmpeg not installed. Video conversion features disabled.\n\n"
+                "To install: brew install ffmpeg"))
+        return found
     
     def install_ytdlp(self):
         """Install yt-dlp using pip3"""
-        try:
-            self.log_message("Installing yt-dlp...")
-            result = subprocess.run(["pip3", "install", "yt-dlp"], capture_output=True, text=True)
-            if result.returncode == 0:
-                self.log_message("yt-dlp installed successfully!")
-            else:
-                self.log_message(f"Failed to install yt-dlp: {result.stderr}")
-                messagebox.showerror("Error", "Failed to install yt-dlp. Please install manually: pip3 install yt-dlp")
-        except Exception as e:
-            self.log_message(f"Error installing yt-dlp: {str(e)}")
-    
-    def get_video_hash(self, video_id, title):
-        """Generate unique hash for video to prevent duplicates"""
-        unique_string = f"{video_id}_{title}"
-        return hashlib.md5(unique_string.encode()).hexdigest()
-    
-    def convert_video_with_ffmpeg(self, input_path: str, output_path: str, conversion_options: Dict):
-        """Convert video using FFmpeg"""
-        try:
-            cmd = ["ffmpeg", "-i", input_path, "-y"]  # -y to overwrite
-            
-            if conversion_options.get("codec"):
-                if conversion_options["format"] == "mp3":
-                    cmd.extend(["-acodec", conversion_options["codec"]])
-                else:
-                    cmd.extend(["-vcodec", conversion_options["codec"]])
-                    if conversion_options.get("crf"):
-                        cmd.extend(["-crf", conversion_options["crf"]])
-            
-            cmd.append(output_path)
-            
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                self.log_message(f"✓ Converted: {Path(output_path).name}")
-                # Remove original file if conversion successful
-                if input_path != output_path:
-                    os.remove(input_path)
-                return True
-            else:
-                self.log_message(f"✗ Conversion failed: {result.stderr[:100]}")
-                return False
-                
-        except Exception as e:
-            self.log_message(f"✗ Conversion error: {str(e)}")
-            return False
-    
-    def download_videos(self, username: str):
-        """Download videos from TikTok user"""
-        try:
-            # Clean username
-            clean_username = username.replace('@', '')
-            user_folder = Path(self.download_folder) / clean_username
-            user_folder.mkdir(parents=True, exist_ok=True)
-            
-            # Get video list first
-            self.update_status("Getting video list...")
-            self.log_message(f"Getting videos for @{clean_username}")
-            
-            url = f"https://www.tiktok.com/@{clean_username}"
-            limit = int(self.limit_var.get())
-            
-            # Get video info
-            list_cmd = [
-                "yt-dlp",
-                "--flat-playlist",
-                "--print", "%(id)s %(title)s",
-                "--playlist-end", str(limit)
-            ]
-            
-            # Add SSL bypass if enabled
-            if self.ssl_bypass_var.get():
-                list_cmd.append("--no-check-certificate")
-            
-            list_cmd.append(url)
-            
-            result = subprocess.run(list_cmd, capture_output=True, text=True, timeout=60)
-            
-            if result.returncode != 0:
-                self.log_message(f"✗ Failed to get video list: {result.stderr}")
-                return
-            
-            # Parse video list
-            videos = []
-            for line in result.stdout.strip().split('\n'):
-                if line.strip():
-                    parts = line.split(' ', 1)
-                    if len(parts) >= 2:
-                        video_id = parts[0]
-                        title = parts[1] if len(parts) > 1 else "Unknown"
-                        
-                        # Check if already downloaded
-                        video_hash = self.get_video_hash(video_id, title)
-                        if video_hash not in self.downloaded_videos:
-                            videos.append({'id': video_id, 'title': title, 'hash': video_hash})
-            
-            if not videos:
-                self.log_message("No new videos to download")
-                self.update_status("No new videos found")
-                return
-            
-            self.log_message(f"Found {len(videos)} new videos to download")
-            
-            # Download videos
-            self.update_status(f"Downloading {len(videos)} videos...")
-            successful = 0
-            
-            for i, video in enumerate(videos):
-                self.update_status(f"Downloading {i+1}/{len(videos)}: {video['title'][:30]}...")
-                
-                if self.download_single_video(clean_username, video, user_folder):
-                    successful += 1
-                    self.downloaded_videos.add(video['hash'])
-                    self.update_count()
-                
-                # Small delay between downloads
-                time.sleep(1)
-            
-            self.log_message(f"Download complete: {successful}/{len(videos)} videos downloaded")
-            self.update_status(f"Complete: {successful}/{len(videos)} downloaded")
-            self.save_config()
-            
-        except subprocess.TimeoutExpired:
-            self.log_message("✗ Timeout getting video list")
-        except Exception as e:
-            self.log_message(f"✗ Error: {str(e)}")
-        finally:
-            if not self.is_monitoring:
-                self.progress.stop()
-                self.download_btn.config(state=tk.NORMAL)
-    
-    def download_single_video(self, username: str, video_info: Dict, user_folder: Path) -> bool:
-        """Download a single video"""
-        try:
-            video_id = video_info['id']
-            title = video_info['title']
-            
-            # Construct URL
-            video_url = f"https://www.tiktok.com/@{username}/video/{video_id}"
-            
-            # Get selected quality format
-            quality_key = self.quality_var.get()
-            format_selector = self.video_formats.get(quality_key, "best")
-            
-            # Build filename
-            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
-            filename_template = f"{username}_{video_id}_{safe_title}.%(ext)s"
-            
-            # Build download command
-            download_cmd = [
-                "yt-dlp",
-                "--format", format_selector,
-                "--output", str(user_folder / filename_template),
-                "--no-warnings"
-            ]
-            
-            # Add SSL bypass if enabled
-            if self.ssl_bypass_var.get():
-                download_cmd.append("--no-check-certificate")
-            
-            # Add optional features
-            if self.metadata_var.get():
-                download_cmd.append("--write-info-json")
-            if self.thumbnail_var.get():
-                download_cmd.append("--write-thumbnail")
-            
-            download_cmd.append(video_url)
-            
-            # Execute download
-            result = subprocess.run(download_cmd, capture_output=True, text=True, timeout=120)
-            
-            if result.returncode == 0:
-                # Handle video conversion if enabled
-                conversion_key = self.conversion_var.get()
-                if conversion_key != "No Conversion" and conversion_key in self.conversion_options:
-                    conversion_opts = self.conversion_options[conversion_key]
-                    if conversion_opts:
-                        # Find the downloaded file
-                        for file_path in user_folder.glob(f"*{video_id}*"):
-                            if file_path.suffix in ['.mp4', '.webm', '.mkv']:
-                                new_ext = conversion_opts['format']
-                                output_path = file_path.with_suffix(f'.{new_ext}')
-                                self.convert_video_with_ffmpeg(str(file_path), str(output_path), conversion_opts)
-                                break
-                
-                self.log_message(f"✓ Downloaded: {title[:40]}")
-                return True
-            else:
-                self.log_message(f"✗ Failed: {title[:40]} - {result.stderr[:50]}")
-                return False
-                
-        except subprocess.TimeoutExpired:
-            self.log_message(f"✗ Timeout: {title[:40]}")
-            return False
-        except Exception as e:
-            self.log_message(f"✗ Error: {title[:40]} - {str(e)}")
-            return False
+        installed = super().install_ytdlp()
+        if not installed:
+            self.root.after(0, lambda: messagebox.showerror(
+                "Error", "Failed to install yt-dlp. Please install manually: pip3 install yt-dlp"))
+        return installed
     
     def start_download(self):
-        """Start download in separate thread"""
-        username = self.username_var.get().strip()
-        if not username:
-            messagebox.showerror("Error", "Please enter a username")
+        """Queue a manual download ahead of any monitor checks"""
+        if not self.apply_settings():
             return
-        
-        self.download_folder = self.folder_var.get()
-        
-        # Disable button and start progress
-        self.download_btn.config(state=tk.DISABLED)
-        self.progress.start()
-        
-        # Start download thread
-        thread = threading.Thread(target=self.download_videos, args=(username,))
-        thread.daemon = True
-        thread.start()
-    
-    def start_monitoring(self):
-        """Start monitoring mode"""
-        username = self.username_var.get().strip()
+        username = self.username
         if not username:
             messagebox.showerror("Error", "Please enter a username")
             return
         
+        self.enqueue_download(username)
+    
+    def toggle_monitoring(self):
+        """Start or stop monitoring mode"""
         if self.is_monitoring:
             # Stop monitoring
-            self.is_monitoring = False
+            self.stop_monitoring()
             self.monitor_btn.config(text="Start Monitoring")
-            self.download_btn.config(state=tk.NORMAL)
-            self.progress.stop()
+            if not self.queue_jobs:
+                self.progress.stop()
             self.update_status("Monitoring stopped")
-            self.log_message("Monitoring stopped")
+            
+            pending = self.conversion_pipeline.pending
+            if pending and not messagebox.askyesno(
+                    "Pending Conversions",
+                    f"{pending} conversions are still pending.\n\n"
+                    "Finish them in the background? (No cancels them)"):
+                self.cancel_conversions()
         else:
+            if not self.apply_settings():
+                return
+            accounts = self.get_monitor_accounts()
+            if not accounts:
+                messagebox.showerror("Error", "Please enter a username")
+                return
+            
             # Start monitoring
-            self.is_monitoring = True
             self.monitor_btn.config(text="Stop Monitoring")
-            self.download_btn.config(state=tk.DISABLED)
             self.progress.start()
             self.update_status("Monitoring started")
-            self.log_message(f"Started monitoring @{username} every {self.check_interval_var.get()} minutes")
-            
-            # Start monitoring thread
-            self.monitor_thread = threading.Thread(target=self.monitor_loop, args=(username,))
-            self.monitor_thread.daemon = True
-            self.monitor_thread.start()
-    
-    def monitor_loop(self, username):
-        """Main monitoring loop"""
-        while self.is_monitoring:
-            try:
-                self.download_videos(username)
-                
-                # Wait for the specified interval
-                interval_minutes = self.check_interval_var.get()
-                for _ in range(interval_minutes * 60):  # Convert to seconds
-                    if not self.is_monitoring:
-                        break
-                    time.sleep(1)
-                    
-            except Exception as e:
-                self.log_message(f"Monitoring error: {str(e)}")
-                time.sleep(60)  # Wait 1 minute before retrying
-    
-    def load_config(self):
-        """Load configuration from file"""
-        try:
-            if os.path.exists(self.config_file):
-                with open(self.config_file, 'r') as f:
-                    config = json.load(f)
-                    self.downloaded_videos = set(config.get('downloaded_videos', []))
-                    self.download_folder = config.get('download_folder', self.download_folder)
-        except Exception as e:
-            self.log_message(f"Error loading config: {str(e)}")
-    
-    def save_config(self):
-        """Save configuration to file"""
-        try:
-            config = {
-                'downloaded_videos': list(self.downloaded_videos),
-                'download_folder': self.download_folder
-            }
-            with open(self.config_file, 'w') as f:
-                json.dump(config, f, indent=2)
-        except Exception as e:
-            self.log_message(f"Error saving config: {str(e)}")
+            self.start_monitoring(accounts)
     
     def on_closing(self):
         """Handle application closing"""
-        self.save_config()
+        self.apply_settings()
+        self.close()
         self.root.destroy()
     
     def run(self):
@@ -572,4 +475,4 @@ def main():
     app.run()
 
 if __name__ == "__main__":
-    main()
+    main()
\ No newline at end of file
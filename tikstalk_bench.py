@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+Tikstalk - Benchmark Harness
+Author: @henrefresh
+Description: Measures engine throughput against a local stand-in for TikTok and yt-dlp
+Features: Fake yt-dlp executable and in-process module, configurable latency and
+          bandwidth, videos/min, per-stage latency percentiles, CPU time, peak memory
+"""
+
+import argparse
+import itertools
+import json
+import os
+import shutil
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+import zlib
+from typing import Dict, List, Optional
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import tikstalk_engine
+from tikstalk_engine import (METADATA_PREFIX, OUTPUT_PREFIX, PROGRESS_FIELDS, PROGRESS_PREFIX,
+                             TikstalkEngine, MonitorScheduler, format_bytes)
+
+SITE_ENV = "TIKSTALK_BENCH_SITE"
+
+
+class FakeSite:
+    """Synthetic TikTok: profile listings and media served at a set latency and bandwidth"""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, videos: int = 50, list_latency: float = 0.5, video_latency: float = 0.2,
+                 video_size: int = 2 * 1024 * 1024, bandwidth: int = 0, sample_path: Optional[str] = None):
+        self.videos = videos
+        self.list_latency = list_latency
+        self.video_latency = video_latency
+        self.video_size = video_size
+        self.bandwidth = bandwidth  # bytes per second per download, 0 for unlimited
+        self.sample_path = sample_path
+
+    def to_env(self) -> str:
+        return json.dumps(self.__dict__)
+
+    @classmethod
+    def from_env(cls) -> "FakeSite":
+        return cls(**json.loads(os.environ[SITE_ENV]))
+
+    def video_id(self, profile_url: str, index: int) -> str:
+        """Newest-first IDs, distinct per account"""
+        account = zlib.crc32(profile_url.rstrip('/').rsplit('@', 1)[-1].encode())
+        return str(7000000000000000000 - account * 100000 - index)
+
+    def list_videos(self, profile_url: str, start: int, end: int) -> List[Dict]:
+        """Profile entries start..end, after the listing latency"""
+        time.sleep(self.list_latency)
+        return [{'id': self.video_id(profile_url, i), 'title': f"Benchmark video {i}"}
+                for i in range(start, min(end, self.videos) + 1)]
+
+    def metadata(self, video_id: str) -> Dict:
+        return {'id': video_id, 'title': f"Benchmark video {video_id}", 'uploader': "bench",
+                'upload_date': "20240101", 'timestamp': 1704067200, 'duration': 15.0,
+                'view_count': int(video_id[-4:]), 'like_count': 0, 'comment_count': 0,
+                'repost_count': 0, 'description': ""}
+
+    def download(self, output_template: str, video_id: str, progress=None) -> str:
+        """Write one video at the configured bandwidth, reporting (downloaded, total) to progress"""
+        time.sleep(self.video_latency)
+        path = (output_template.replace("%(ext)s", "mp4").replace("%(id)s", video_id)
+                .replace("%(title).50B", f"Benchmark video {video_id}"))
+        source = open(self.sample_path, 'rb') if self.sample_path else None
+        total = os.path.getsize(self.sample_path) if source else self.video_size
+        # Distinct bytes per video, so content dedup has nothing to collapse
+        filler = (video_id.encode() * (self.chunk_size // len(video_id) + 1))[:self.chunk_size]
+        started = time.monotonic()
+        written = 0
+        try:
+            with open(path, 'wb') as f:
+                while written < total:
+                    chunk = source.read(self.chunk_size) if source else filler[:total - written]
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    written += len(chunk)
+                    if self.bandwidth:
+                        ahead = written / self.bandwidth - (time.monotonic() - started)
+                        if ahead > 0:
+                            time.sleep(ahead)
+                    if progress:
+                        progress(written, total)
+        finally:
+            if source:
+                source.close()
+        return os.path.abspath(path)
+
+
+def fake_ytdlp_main(args: List[str]) -> int:
+    """Entry point of the fake yt-dlp executable"""
+    site = FakeSite.from_env()
+    if "--version" in args:
+        print("benchmark")
+        return 0
+
+    def option(name: str, default: str) -> str:
+        return args[args.index(name) + 1] if name in args else default
+
+    if "--flat-playlist" in args:
+        for entry in site.list_videos(args[-1], int(option("--playlist-start", "1")),
+                                      int(option("--playlist-end", str(site.videos)))):
+            print(f"{entry['id']} {entry['title']}", flush=True)
+        return 0
+
+    if "--batch-file" in args:
+        with open(option("--batch-file", "")) as f:
+            urls = [line.strip() for line in f if line.strip()]
+    else:
+        urls = [args[-1]]
+    prints = [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == "--print"]
+
+    for url in urls:
+        video_id = url.rstrip('/').rsplit('/', 1)[-1]
+
+        def progress(downloaded: int, total: int):
+            if "--progress-template" in args:
+                values = {'downloaded_bytes': downloaded, 'total_bytes': total}
+                print(PROGRESS_PREFIX, " ".join(str(values.get(field, "NA")) for field in PROGRESS_FIELDS),
+                      video_id, flush=True)
+
+        path = site.download(option("--output", "%(id)s.%(ext)s"), video_id, progress)
+        metadata = site.metadata(video_id)
+        if any(OUTPUT_PREFIX in template for template in prints):
+            print(OUTPUT_PREFIX, video_id, path, flush=True)
+        if any(METADATA_PREFIX in template for template in prints):
+            print(METADATA_PREFIX, json.dumps(metadata), flush=True)
+    return 0
+
+
+class FakeYoutubeDL:
+    """Stand-in for yt_dlp.YoutubeDL that serves from a FakeSite in this process"""
+
+    site = None
+
+    def __init__(self, params: Dict):
+        self.params = dict(params)
+
+    def extract_info(self, url: str, download: bool = True, process: bool = True) -> Dict:
+        if self.params.get('extract_flat'):
+            if not process:
+                return {'entries': iter(self.site.list_videos(url, 1, self.site.videos))}
+            entries = self.site.list_videos(url, self.params.get('playliststart', 1),
+                                            self.params.get('playlistend', 1))
+            return {'entries': entries}
+
+        video_id = url.rstrip('/').rsplit('/', 1)[-1]
+
+        def progress(downloaded: int, total: int):
+            for hook in self.params.get('progress_hooks', []):
+                hook({'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': total})
+
+        path = self.site.download(self.params['outtmpl']['default'], video_id, progress)
+        for hook in self.params.get('post_hooks', []):
+            hook(path)
+        return self.site.metadata(video_id)
+
+    def sanitize_info(self, info: Dict) -> Dict:
+        return info
+
+
+def fake_yt_dlp_module(site: FakeSite):
+    """A yt_dlp look-alike module for the in-process backend"""
+    FakeYoutubeDL.site = site
+    return types.SimpleNamespace(YoutubeDL=FakeYoutubeDL,
+                                 utils=types.SimpleNamespace(YoutubeDLError=RuntimeError))
+
+
+def install_fake_executable(bin_dir: str):
+    """Put a fake yt-dlp first on PATH"""
+    script = os.path.join(bin_dir, "fake_yt_dlp.py")
+    with open(script, 'w') as f:
+        f.write(f"import sys\nsys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+                "from tikstalk_bench import fake_ytdlp_main\nsys.exit(fake_ytdlp_main(sys.argv[1:]))\n")
+    if os.name == 'nt':
+        with open(os.path.join(bin_dir, "yt-dlp.cmd"), 'w') as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        launcher = os.path.join(bin_dir, "yt-dlp")
+        with open(launcher, 'w') as f:
+            f.write(f'#!/bin/sh\nexec "{sys.executable}" "{script}" "$@"\n')
+        os.chmod(launcher, os.stat(launcher).st_mode | stat.S_IEXEC)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+
+
+def make_sample_clip(path: str, seconds: int) -> Optional[str]:
+    """Render a synthetic H.264/AAC clip with ffmpeg, so conversions do real work"""
+    if not shutil.which("ffmpeg"):
+        return None
+    cmd = ["ffmpeg", "-y", "-loglevel", "error",
+           "-f", "lavfi", "-i", f"testsrc=duration={seconds}:size=576x1024:rate=30",
+           "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+           "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest", path]
+    try:
+        subprocess.run(cmd, check=True, timeout=300)
+        return path
+    except (subprocess.SubprocessError, OSError):
+        return None
+
+
+class TimedBackend:
+    """Backend wrapper that records how long listing and download calls take"""
+
+    def __init__(self, backend, record):
+        self.backend = backend
+        self.record = record
+
+    def __getattr__(self, name):
+        attribute = getattr(self.backend, name)
+        if name != 'download_many':
+            return attribute
+
+        # Only wrapped when the backend has it, so batch-mode detection still works
+        def download_many(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            finally:
+                self.record('batch', time.perf_counter() - started)
+        return download_many
+
+    def list_videos(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.backend.list_videos(*args, **kwargs)
+        finally:
+            self.record('list', time.perf_counter() - started)
+
+    def iter_videos(self, *args, **kwargs):
+        """Time to the first streamed entry, and the whole stream including download back-pressure"""
+        started = time.perf_counter()
+        waiting = True
+        try:
+            for entry in self.backend.iter_videos(*args, **kwargs):
+                if waiting:
+                    self.record('first', time.perf_counter() - started)
+                    waiting = False
+                yield entry
+        finally:
+            self.record('stream', time.perf_counter() - started)
+
+    def download(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.backend.download(*args, **kwargs)
+        finally:
+            self.record('download', time.perf_counter() - started)
+
+
+class BenchEngine(TikstalkEngine):
+    """Engine that times each stage and keeps its log off the console"""
+
+    def __init__(self, *args, verbose: bool = False, **kwargs):
+        self.verbose = verbose
+        self.stage_times = {}
+        self.stage_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+        for name, backend in self.backends.items():
+            self.backends[name] = TimedBackend(backend, self.record_stage)
+
+    def record_stage(self, stage: str, seconds: float):
+        with self.stage_lock:
+            self.stage_times.setdefault(stage, []).append(seconds)
+
+    def show_log_line(self, line: str):
+        if self.verbose:
+            print(line, end="")
+
+    def convert_video_with_ffmpeg(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().convert_video_with_ffmpeg(*args, **kwargs)
+        finally:
+            self.record_stage('convert', time.perf_counter() - started)
+
+
+class MemorySampler:
+    """Tracks peak resident memory of this process and its children"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self) -> int:
+        process = psutil.Process()
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.peak = max(self.peak, self.sample())
+            except psutil.Error:
+                pass
+
+    def start(self):
+        if psutil is not None:
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self) -> Optional[int]:
+        """Peak bytes; without psutil, the process-lifetime peak of this process only"""
+        if self.thread:
+            self.stop_event.set()
+            self.thread.join()
+            return self.peak
+        if resource is not None:
+            scale = 1 if sys.platform == 'darwin' else 1024
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+        return None
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def run_scenario(site: FakeSite, backend: str, workers: int, conversion: str, args) -> Dict:
+    """Run one configuration against a fresh engine and index, returning its measurements"""
+    workdir = tempfile.mkdtemp(prefix="tikstalk-bench-")
+    config_file = os.path.join(workdir, "config.json")
+    with open(config_file, 'w') as f:
+        json.dump({'download_folder': os.path.join(workdir, "Downloads")}, f)
+
+    saved_module = tikstalk_engine.yt_dlp
+    if backend == "In-process":
+        tikstalk_engine.yt_dlp = fake_yt_dlp_module(site)
+
+    engine = BenchEngine(config_file=config_file, index_file=os.path.join(workdir, "index.db"),
+                         log_file=os.path.join(workdir, "tikstalk.log"), verbose=args.verbose)
+    engine.backend_name = backend
+    engine.max_workers = workers
+    engine.conversion = conversion
+    engine.limit = site.videos
+    engine.requests_per_second = args.rps
+    engine.batch_size = args.batch_size
+    engine.dedup_content = args.dedup
+    engine.save_metadata = args.metadata
+    engine.save_thumbnails = False
+    usernames = [f"bench{i}" for i in range(1, args.accounts + 1)]
+
+    memory = MemorySampler()
+    cpu_started = time.process_time()
+    children_started = os.times()
+    memory.start()
+    started = time.perf_counter()
+    try:
+        if args.mode == "monitor":
+            run_monitor_pass(engine, usernames, args.max_checks)
+        else:
+            for username in usernames:
+                engine.download_videos(username)
+        engine.postprocessor.drain()
+        engine.conversion_pipeline.drain()
+        elapsed = time.perf_counter() - started
+        downloaded = len(engine.downloaded_videos)
+    finally:
+        peak_memory = memory.stop()
+        children_finished = os.times()
+        engine.close()
+        tikstalk_engine.yt_dlp = saved_module
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    result = {
+        'mode': args.mode,
+        'backend': backend,
+        'workers': workers,
+        'conversion': conversion,
+        'videos': downloaded,
+        'seconds': elapsed,
+        'videos_per_min': downloaded / elapsed * 60 if elapsed else 0.0,
+        'cpu_seconds': time.process_time() - cpu_started,
+        'child_cpu_seconds': (children_finished.children_user - children_started.children_user +
+                              children_finished.children_system - children_started.children_system),
+        'peak_memory': peak_memory,
+        'stages': {}
+    }
+    for stage, times in engine.stage_times.items():
+        result['stages'][stage] = {
+            'count': len(times),
+            'p50': percentile(times, 50),
+            'p90': percentile(times, 90),
+            'p99': percentile(times, 99),
+            'max': max(times)
+        }
+    return result
+
+
+def run_monitor_pass(engine: TikstalkEngine, usernames: List[str], max_checks: int):
+    """Check every account once through the monitor scheduler, with no start-up stagger"""
+    remaining = set(usernames)
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def check(username: str):
+        try:
+            engine.monitor_check(username)
+        finally:
+            with lock:
+                remaining.discard(username)
+                if not remaining:
+                    done.set()
+
+    # Checks run as queue jobs, so the queue needs as many workers as concurrent checks
+    engine.start_queue(max_checks)
+    engine.is_monitoring = True
+    scheduler = MonitorScheduler(check, max_checks, engine.log_message, spread_window=0)
+    scheduler.set_accounts({username: 3600 for username in usernames})
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    done.wait()
+    scheduler.stop()
+    thread.join()
+    engine.is_monitoring = False
+
+
+def format_seconds(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}ms" if value < 10 else f"{value:.1f}s"
+
+
+def print_result(result: Dict):
+    memory = format_bytes(result['peak_memory']) if result['peak_memory'] else "n/a"
+    print(f"\n{result['mode']} | {result['backend']} | {result['workers']} workers | {result['conversion']}")
+    print(f"  {result['videos']} videos in {result['seconds']:.1f}s = {result['videos_per_min']:.1f} videos/min")
+    print(f"  CPU {result['cpu_seconds']:.2f}s (+{result['child_cpu_seconds']:.2f}s in child processes), "
+          f"peak memory {memory}")
+    for stage, stats in result['stages'].items():
+        print(f"  {stage:<9} n={stats['count']:<5} p50 {format_seconds(stats['p50']):>7}  "
+              f"p90 {format_seconds(stats['p90']):>7}  p99 {format_seconds(stats['p99']):>7}  "
+              f"max {format_seconds(stats['max']):>7}")
+
+
+def scenario_key(result: Dict) -> str:
+    return f"{result['mode']}/{result['backend']}/{result['workers']}/{result['conversion']}"
+
+
+def compare_results(results: List[Dict], baseline_file: str, tolerance: float) -> int:
+    """Report scenarios whose throughput fell more than tolerance percent below the baseline"""
+    with open(baseline_file, 'r') as f:
+        baseline = {scenario_key(result): result for result in json.load(f)}
+
+    regressions = 0
+    print()
+    for result in results:
+        previous = baseline.get(scenario_key(result))
+        if not previous or not previous['videos_per_min']:
+            continue
+        change = (result['videos_per_min'] / previous['videos_per_min'] - 1) * 100
+        marker = "✓"
+        if change < -tolerance:
+            marker = "✗"
+            regressions += 1
+        print(f"{marker} {scenario_key(result)}: {previous['videos_per_min']:.1f} -> "
+              f"{result['videos_per_min']:.1f} videos/min ({change:+.1f}%)")
+    return 1 if regressions else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Benchmark the Tikstalk engine against a local fake TikTok")
+    parser.add_argument("--mode", choices=["download", "monitor"], default="download",
+                        help="download each account in turn, or check them all through the monitor scheduler")
+    parser.add_argument("--accounts", type=int, default=1, help="number of fake accounts (default: %(default)s)")
+    parser.add_argument("--max-checks", type=int, default=2,
+                        help="concurrent checks in monitor mode (default: %(default)s)")
+    parser.add_argument("--videos", type=int, default=50, help="videos per account (default: %(default)s)")
+    parser.add_argument("--list-latency", type=float, default=0.5,
+                        help="seconds per profile listing call (default: %(default)s)")
+    parser.add_argument("--video-latency", type=float, default=0.2,
+                        help="seconds before each video starts (default: %(default)s)")
+    parser.add_argument("--video-size", type=int, default=2048, help="KB per synthetic video (default: %(default)s)")
+    parser.add_argument("--bandwidth", type=int, default=0,
+                        help="KB/s per download, 0 for unlimited (default: %(default)s)")
+    parser.add_argument("--clip-seconds", type=int, default=5,
+                        help="length of the ffmpeg-rendered clip used when converting (default: %(default)s)")
+    parser.add_argument("--workers", default="1,3,8", help="comma-separated worker counts (default: %(default)s)")
+    parser.add_argument("--backends", default="Subprocess,In-process",
+                        help="comma-separated yt-dlp engines (default: %(default)s)")
+    parser.add_argument("--conversions", default="No Conversion",
+                        help="comma-separated conversion settings, e.g. 'No Conversion,Compress Video'")
+    parser.add_argument("--batch-size", type=int, default=0,
+                        help="videos per yt-dlp invocation, 0 for one per video (default: %(default)s)")
+    parser.add_argument("--rps", type=float, default=1000.0,
+                        help="rate limit in requests per second; 1 matches production (default: %(default)s)")
+    parser.add_argument("--dedup", action="store_true", help="hash and link identical files")
+    parser.add_argument("--metadata", action="store_true", help="write .info.json sidecars")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="results file from an earlier run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=10.0,
+                        help="allowed throughput drop against --compare, in percent (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true", help="show the engine log")
+    return parser
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    backends = [name.strip() for name in args.backends.split(",") if name.strip()]
+    conversions = [name.strip() for name in args.conversions.split(",") if name.strip()]
+    try:
+        workers = [max(1, int(count)) for count in args.workers.split(",")]
+    except ValueError:
+        parser.error("--workers must be comma-separated whole numbers")
+
+    for backend in backends:
+        if backend not in ("Subprocess", "In-process"):
+            parser.error("--backends must be Subprocess and/or In-process")
+    bin_dir = tempfile.mkdtemp(prefix="tikstalk-bench-bin-")
+    try:
+        sample = None
+        if any(conversion != "No Conversion" for conversion in conversions):
+            sample = make_sample_clip(os.path.join(bin_dir, "sample.mp4"), args.clip_seconds)
+            if sample is None:
+                print("ffmpeg not found or failed; converting synthetic bytes instead of a real clip")
+        site = FakeSite(videos=args.videos, list_latency=args.list_latency, video_latency=args.video_latency,
+                        video_size=args.video_size * 1024, bandwidth=args.bandwidth * 1024, sample_path=sample)
+        os.environ[SITE_ENV] = site.to_env()
+        install_fake_executable(bin_dir)
+
+        results = []
+        for backend, count, conversion in itertools.product(backends, workers, conversions):
+            result = run_scenario(site, backend, count, conversion, args)
+            print_result(result)
+            results.append(result)
+    finally:
+        shutil.rmtree(bin_dir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        return compare_results(results, args.compare, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Tikstalk - Headless CLI
+Author: @henrefresh
+Description: Command-line and daemon front end for the Tikstalk engine
+Features: One-shot downloads, long-running monitoring, no tkinter import
+"""
+
+import argparse
+import json
+import signal
+import sys
+import threading
+
+from tikstalk_engine import MetadataCatalog, TikstalkEngine, format_bytes
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the command-line parser"""
+    parser = argparse.ArgumentParser(description="Headless Tikstalk downloader and monitor")
+    parser.add_argument("--config", default="tikstalk_simple_config.json",
+                        help="config file, shared with the GUI (default: %(default)s)")
+    parser.add_argument("--index", default="tikstalk_downloads.db",
+                        help="download index database (default: %(default)s)")
+    parser.add_argument("--log-file", default="tikstalk.log",
+                        help="rotating log file (default: %(default)s)")
+    parser.add_argument("--folder", help="download folder")
+    parser.add_argument("--quality", help="video quality, e.g. 'Best MP4'")
+    parser.add_argument("--conversion", help="conversion, e.g. 'Convert to MP4'")
+    parser.add_argument("--limit", type=int, help="maximum videos listed per account (0 for the whole account)")
+    parser.add_argument("--workers", type=int, help="concurrent downloads")
+    parser.add_argument("--queue-workers", type=int, help="accounts downloaded at once from the job queue")
+    parser.add_argument("--backend", help="yt-dlp engine: 'Subprocess' or 'In-process'")
+    parser.add_argument("--batch-size", type=int,
+                        help="videos per yt-dlp invocation (subprocess engine); 0 or 1 for one per video")
+    parser.add_argument("--concurrent-fragments", type=int, help="yt-dlp --concurrent-fragments in batch mode")
+    parser.add_argument("--no-metadata", action="store_true", help="don't save .info.json files")
+    parser.add_argument("--no-catalog", action="store_true", help="don't add metadata to the catalog")
+    parser.add_argument("--no-thumbnails", action="store_true", help="don't save thumbnails")
+    parser.add_argument("--thumbnails", choices=["compact", "files"],
+                        help="cache compact thumbnails in the database, or save full-size files next to videos")
+    parser.add_argument("--verify-ssl", action="store_true", help="don't bypass SSL verification")
+    parser.add_argument("--metrics-port", type=int, help="serve metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file", help="write a JSON metrics snapshot to this file periodically")
+    parser.add_argument("--max-total-gb", type=float, help="evict old videos above this total size (0 for no limit)")
+    parser.add_argument("--max-user-gb", type=float, help="evict old videos above this size per account")
+    parser.add_argument("--max-age-days", type=float, help="evict videos downloaded longer ago than this")
+    parser.add_argument("--keep-last", type=int, help="keep only the newest N videos per account")
+    parser.add_argument("--evict", choices=["oldest", "lru"], help="eviction order: oldest download or least recently used")
+    parser.add_argument("--min-free-gb", type=float, help="free space required before each download")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    download = subparsers.add_parser("download", help="download new videos once and exit")
+    download.add_argument("usernames", nargs="+", help="TikTok usernames")
+    download.add_argument("--from-start", action="store_true",
+                          help="ignore saved listing checkpoints and list each account from its newest video")
+
+    monitor = subparsers.add_parser("monitor", help="monitor accounts until stopped (daemon mode)")
+    monitor.add_argument("accounts", nargs="*",
+                         help="'username' or 'username:minutes' (default: the accounts saved by the GUI)")
+    monitor.add_argument("--interval", type=int, help="default check interval in minutes")
+    monitor.add_argument("--max-checks", type=int, help="concurrent account checks")
+    monitor.add_argument("--full-listing", action="store_true", help="list every video instead of stopping at known ones")
+    monitor.add_argument("--on-stop", choices=["drain", "cancel"], default="drain",
+                         help="finish or cancel pending conversions when stopping (default: %(default)s)")
+
+    import_metadata = subparsers.add_parser("import-metadata",
+                                            help="load existing .info.json files into the metadata catalog")
+    import_metadata.add_argument("--delete-sidecars", action="store_true",
+                                 help="remove the .info.json files once they are in the catalog")
+
+    job_queue = subparsers.add_parser("queue", help="show, cancel or reprioritise queued downloads")
+    job_queue.add_argument("--cancel", type=int, metavar="ID", action="append", default=[],
+                           help="cancel a queued job (repeatable)")
+    job_queue.add_argument("--run-next", type=int, metavar="ID", help="move a queued job to the front")
+    job_queue.add_argument("--clear", choices=["manual", "monitor"], help="cancel every queued job from a source")
+
+    export_thumbnails = subparsers.add_parser("export-thumbnails", help="write cached thumbnails out as files")
+    export_thumbnails.add_argument("folder", help="destination folder")
+    export_thumbnails.add_argument("--user", help="only this username")
+
+    subparsers.add_parser("retention", help="apply the retention limits once and exit")
+
+    catalog = subparsers.add_parser("catalog", help="query the metadata catalog")
+    catalog.add_argument("--user", help="only this username")
+    catalog.add_argument("--since", help="uploaded on or after this date (YYYYMMDD)")
+    catalog.add_argument("--until", help="uploaded on or before this date (YYYYMMDD)")
+    catalog.add_argument("--min-views", type=int, help="at least this many views")
+    catalog.add_argument("--sort", default="upload_date", choices=MetadataCatalog.sort_columns,
+                         help="sort column, largest first (default: %(default)s)")
+    catalog.add_argument("--count", type=int, default=50, help="maximum rows (default: %(default)s)")
+    catalog.add_argument("--json", action="store_true", help="print rows as JSON lines")
+    return parser
+
+
+def apply_arguments(engine: TikstalkEngine, args, parser: argparse.ArgumentParser):
+    """Override engine settings with the given command-line options"""
+    if args.folder:
+        engine.download_folder = args.folder
+    if args.quality:
+        if args.quality not in engine.video_formats:
+            parser.error(f"--quality must be one of: {', '.join(engine.video_formats)}")
+        engine.quality = args.quality
+    if args.conversion:
+        if args.conversion not in engine.conversion_options:
+            parser.error(f"--conversion must be one of: {', '.join(engine.conversion_options)}")
+        engine.conversion = args.conversion
+    if args.backend:
+        if args.backend not in engine.backends:
+            parser.error(f"--backend must be one of: {', '.join(engine.backends)}")
+        engine.backend_name = args.backend
+    if args.limit is not None:
+        engine.limit = max(0, args.limit)
+    if args.workers:
+        engine.max_workers = max(1, args.workers)
+    if args.queue_workers:
+        engine.queue_workers = max(1, args.queue_workers)
+    if args.batch_size is not None:
+        engine.batch_size = max(0, args.batch_size)
+    if args.concurrent_fragments:
+        engine.concurrent_fragments = max(1, args.concurrent_fragments)
+    if args.no_metadata:
+        engine.save_metadata = False
+    if args.no_catalog:
+        engine.catalog_metadata = False
+    if args.no_thumbnails:
+        engine.save_thumbnails = False
+    if args.thumbnails:
+        engine.thumbnail_mode = args.thumbnails
+    if args.verify_ssl:
+        engine.bypass_ssl = False
+    if args.metrics_port is not None:
+        engine.metrics_port = args.metrics_port
+    if args.metrics_file is not None:
+        engine.metrics_file = args.metrics_file
+    if args.max_total_gb is not None:
+        engine.retention_max_total_gb = max(0, args.max_total_gb)
+    if args.max_user_gb is not None:
+        engine.retention_max_user_gb = max(0, args.max_user_gb)
+    if args.max_age_days is not None:
+        engine.retention_max_age_days = max(0, args.max_age_days)
+    if args.keep_last is not None:
+        engine.retention_keep_last = max(0, args.keep_last)
+    if args.evict:
+        engine.retention_order = args.evict
+    if args.min_free_gb is not None:
+        engine.min_free_gb = max(0, args.min_free_gb)
+
+
+def run_download(engine: TikstalkEngine, args):
+    """Queue new videos for each user, wait for them and their conversions, then exit
+    
+    The first Ctrl+C pauses the listings at a checkpoint and lets running
+    downloads finish; the next run continues from there.
+    """
+    job_ids = []
+
+    def pause(*_):
+        engine.log_message("Pausing listings; Ctrl+C again to quit now")
+        engine.pause_listing()
+        for job_id in job_ids:
+            engine.job_queue.cancel(job_id)
+        signal.signal(signal.SIGINT, signal.default_int_handler)
+
+    signal.signal(signal.SIGINT, pause)
+    if args.from_start:
+        for username in args.usernames:
+            engine.checkpoints.remove(username.replace('@', ''))
+    job_ids.extend(engine.enqueue_download(username) for username in args.usernames)
+    for job_id in job_ids:
+        engine.job_queue.wait(job_id)
+    engine.postprocessor.drain()
+    engine.conversion_pipeline.drain()
+
+
+def run_import_metadata(engine: TikstalkEngine, args):
+    """Load existing sidecars into the catalog"""
+    engine.import_metadata_sidecars(delete_sidecars=args.delete_sidecars)
+
+
+def run_export_thumbnails(engine: TikstalkEngine, args):
+    """Write cached thumbnails to a folder"""
+    engine.export_thumbnails(args.folder, username=args.user)
+
+
+def run_queue(engine: TikstalkEngine, args):
+    """Edit the persistent job queue, then list it"""
+    for job_id in args.cancel:
+        engine.cancel_job(job_id)
+    if args.run_next is not None and not engine.prioritise_job(args.run_next):
+        engine.log_message(f"✗ Job {args.run_next} is not queued")
+    if args.clear:
+        engine.log_message(f"Cancelled {engine.job_queue.cancel_source(args.clear)} queued {args.clear} jobs")
+    for job in engine.job_queue.jobs():
+        print(f"{job['id']:>6}  {job['state']:8}  {job['source']:8}  {job['priority']:>4}  @{job['username']}")
+    for username, position in engine.checkpoints.all().items():
+        print(f"paused listing of @{username} at video {position}")
+
+
+def run_retention(engine: TikstalkEngine, args):
+    """Refresh the manifest and apply the retention limits once"""
+    if not engine.retention_indexed:
+        engine.index_existing_downloads()
+    engine.refresh_manifest()
+    freed = engine.enforce_retention()
+    engine.log_message(f"Retention: evicted {engine.evicted_count} videos, freed {format_bytes(freed)}")
+
+
+def run_catalog(engine: TikstalkEngine, args):
+    """Print catalog rows matching the filters"""
+    rows = engine.catalog.query(username=args.user, since=args.since, until=args.until,
+                                min_views=args.min_views, order_by=args.sort, limit=args.count)
+    for row in rows:
+        if args.json:
+            print(json.dumps(row, ensure_ascii=False))
+        else:
+            print(f"{row['upload_date'] or '-':8}  {row['view_count'] or 0:>10}  "
+                  f"{row['username']}/{row['video_id']}  {(row['title'] or '')[:60]}")
+
+
+def run_monitor(engine: TikstalkEngine, args):
+    """Monitor accounts until SIGINT or SIGTERM"""
+    if args.interval:
+        engine.check_interval = max(1, args.interval)
+    if args.max_checks:
+        engine.max_concurrent_checks = max(1, args.max_checks)
+    if args.full_listing:
+        engine.incremental = False
+    if args.accounts:
+        engine.username = ""
+        engine.monitored_accounts = [account.replace(':', ' ', 1) for account in args.accounts]
+
+    accounts = engine.get_monitor_accounts()
+    if not accounts:
+        engine.log_message("No accounts to monitor")
+        return 1
+
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    engine.start_monitoring(accounts)
+    stop.wait()
+
+    # Let running checks finish before deciding what to do with conversions
+    engine.stop_monitoring()
+    engine.monitor_thread.join()
+    engine.postprocessor.drain()
+    if args.on_stop == "cancel":
+        engine.cancel_conversions()
+    else:
+        engine.conversion_pipeline.drain()
+    return 0
+
+
+def main(argv=None) -> int:
+    """Main function"""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    engine = TikstalkEngine(config_file=args.config, index_file=args.index, log_file=args.log_file)
+    # Command-line options apply to this run only; the saved (GUI) settings are left alone
+    engine.save_settings = False
+    apply_arguments(engine, args, parser)
+    if args.command in ("download", "monitor"):
+        engine.start_metrics()
+        engine.check_dependencies()
+        engine.resume_interrupted()
+        engine.start_queue()
+        engine.start_retention()
+
+    try:
+        if args.command == "download":
+            return run_download(engine, args) or 0
+        if args.command == "import-metadata":
+            return run_import_metadata(engine, args) or 0
+        if args.command == "catalog":
+            return run_catalog(engine, args) or 0
+        if args.command == "export-thumbnails":
+            return run_export_thumbnails(engine, args) or 0
+        if args.command == "queue":
+            return run_queue(engine, args) or 0
+        if args.command == "retention":
+            return run_retention(engine, args) or 0
+        return run_monitor(engine, args)
+    finally:
+        engine.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,3344 @@
+#!/usr/bin/env python3
+"""
+Tikstalk - Download Engine
+Author: @henrefresh
+Description: Download, conversion and monitoring engine shared by the GUI and the headless CLI
+Features: yt-dlp backends, download index, monitor scheduler, FFmpeg pipeline, metrics
+"""
+
+import threading
+import time
+import os
+import json
+import logging
+import queue
+import subprocess
+import tempfile
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+import bisect
+import hashlib
+import heapq
+import importlib.util
+import itertools
+import random
+import re
+import shutil
+import sqlite3
+import ssl
+import urllib.request
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+# Imported on first use by the in-process backend; it takes a good part of a second
+yt_dlp = None
+
+
+def load_yt_dlp():
+    """Import yt_dlp on demand and return the module"""
+    global yt_dlp
+    if yt_dlp is None:
+        import yt_dlp as module
+        yt_dlp = module
+    return yt_dlp
+
+
+class BackendError(Exception):
+    """Raised when a yt-dlp backend fails to list or download videos"""
+
+
+class ThrottledError(BackendError):
+    """Raised when the site signals that we are being rate limited"""
+
+
+THROTTLE_MARKERS = ("429", "Too Many Requests", "rate limit", "rate-limit")
+
+
+def is_throttle_message(message: str) -> bool:
+    """Whether a yt-dlp error message looks like rate limiting"""
+    return any(marker.lower() in message.lower() for marker in THROTTLE_MARKERS)
+
+
+def backend_error(message: str) -> BackendError:
+    """Build the right BackendError subclass for a yt-dlp error message"""
+    if is_throttle_message(message):
+        return ThrottledError(message)
+    return BackendError(message)
+
+
+class RateLimiter:
+    """Token bucket shared by listing and download calls, with adaptive backoff
+    
+    Tokens refill at `rate` per second up to `burst`. A throttling signal
+    halves the rate and pauses the bucket for an exponentially growing,
+    jittered delay; every success then nudges the rate back toward its base.
+    """
+    
+    def __init__(self, rate: float = 1.0, burst: int = 2, min_rate: float = 0.05,
+                 base_backoff: float = 5, max_backoff: float = 300):
+        self.base_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.backoff_level = 0
+        self.lock = threading.Lock()
+    
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def acquire(self):
+        """Block until a request may be made"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.refill(now)
+                if now >= self.blocked_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+    
+    def on_throttled(self) -> float:
+        """Back off after a throttling signal, returning the pause in seconds"""
+        with self.lock:
+            self.backoff_level += 1
+            self.rate = max(self.min_rate, self.rate / 2)
+            delay = min(self.max_backoff, self.base_backoff * 2 ** (self.backoff_level - 1))
+            delay = random.uniform(delay / 2, delay)
+            now = time.monotonic()
+            self.blocked_until = max(self.blocked_until, now + delay)
+            self.tokens = 0.0
+            self.updated = now
+            return delay
+    
+    def on_success(self):
+        """Recover gradually after a successful request"""
+        with self.lock:
+            self.backoff_level = max(0, self.backoff_level - 1)
+            self.rate = min(self.base_rate, self.rate + self.base_rate * 0.1)
+    
+    def describe(self) -> str:
+        """Short human-readable limiter state"""
+        with self.lock:
+            remaining = self.blocked_until - time.monotonic()
+            if remaining > 0:
+                return f"Backing off {remaining:.0f}s ({self.rate:.2f} req/s)"
+            if self.rate < self.base_rate:
+                return f"Recovering: {self.rate:.2f}/{self.base_rate:.2f} req/s"
+            return f"Rate: {self.rate:.2f} req/s"
+
+
+# Structured progress line printed by the yt-dlp executable, one per update
+PROGRESS_PREFIX = "[tikstalk-progress]"
+PROGRESS_TEMPLATE = (
+    "download:" + PROGRESS_PREFIX +
+    " %(progress.downloaded_bytes)s %(progress.total_bytes)s %(progress.total_bytes_estimate)s"
+    " %(progress.speed)s %(progress.eta)s %(progress.fragment_index)s %(progress.fragment_count)s"
+    " %(info.id)s"
+)
+PROGRESS_FIELDS = ('downloaded_bytes', 'total_bytes', 'total_bytes_estimate',
+                   'speed', 'eta', 'fragment_index', 'fragment_count')
+
+
+def make_progress_event(values: Dict) -> Dict:
+    """Normalise yt-dlp progress values into a progress event dict"""
+    event = {}
+    for field in PROGRESS_FIELDS:
+        try:
+            event[field] = float(values.get(field))
+        except (TypeError, ValueError):
+            event[field] = None
+    if event['total_bytes'] is None:
+        event['total_bytes'] = event['total_bytes_estimate']
+    del event['total_bytes_estimate']
+    return event
+
+
+def format_bytes(size: float) -> str:
+    """Human-readable byte count"""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def parse_progress_line(line: str) -> Optional[Dict]:
+    """Parse a PROGRESS_TEMPLATE line, or return None for any other output"""
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    values = line[len(PROGRESS_PREFIX):].split()
+    event = make_progress_event(dict(zip(PROGRESS_FIELDS, values)))
+    # The trailing video ID tells apart the downloads of a batch invocation
+    if len(values) > len(PROGRESS_FIELDS):
+        event['video_id'] = values[len(PROGRESS_FIELDS)]
+    return event
+
+
+# Lines the subprocess engine prints after a download is moved into place
+OUTPUT_PREFIX = "[tikstalk-file]"
+OUTPUT_TEMPLATE = OUTPUT_PREFIX + " %(id)s %(filepath)s"
+METADATA_PREFIX = "[tikstalk-meta]"
+
+# The info fields kept in the metadata catalog
+CATALOG_FIELDS = ('id', 'title', 'uploader', 'upload_date', 'timestamp', 'duration',
+                  'view_count', 'like_count', 'comment_count', 'repost_count', 'description')
+# Printed for the post-processing stage: the catalog fields plus the thumbnail URL,
+# or the whole info dict when .info.json sidecars are wanted
+INFO_FIELDS = CATALOG_FIELDS + ('thumbnail',)
+METADATA_TEMPLATE = METADATA_PREFIX + " %(.{" + ",".join(INFO_FIELDS) + "})j"
+FULL_METADATA_TEMPLATE = METADATA_PREFIX + " %()j"
+
+# File extensions for thumbnails saved next to their videos
+THUMBNAIL_EXTENSIONS = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp'}
+
+
+# "ERROR: [TikTok] 7312345678901234567: Unable to download ..." -> (video ID, message)
+ERROR_LINE = re.compile(r"^ERROR: \[[^\]]+\] ([\w-]+): (.*)")
+
+
+SIDECAR_SUFFIXES = (".info.json", ".jpg", ".jpeg", ".png", ".webp")
+
+
+def sidecar_paths(media_path: str) -> List[str]:
+    """The .info.json and thumbnail files yt-dlp writes next to a video"""
+    stem = os.path.splitext(media_path)[0]
+    return [stem + suffix for suffix in SIDECAR_SUFFIXES]
+
+
+def media_footprint(media_path: str) -> int:
+    """Bytes used by a video and its sidecar files"""
+    total = 0
+    for path in [media_path] + sidecar_paths(media_path):
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total
+
+
+def file_key(path: str) -> Optional[str]:
+    """Device and inode of a file, shared by every hardlink to it"""
+    try:
+        info = os.stat(path)
+    except OSError:
+        return None
+    return f"{info.st_dev}:{info.st_ino}"
+
+
+def pick_metadata(info: Dict) -> Dict:
+    """Reduce a yt-dlp info dict to the catalog fields"""
+    return {field: info.get(field) for field in CATALOG_FIELDS}
+
+
+class SubprocessBackend:
+    """yt-dlp engine that spawns the yt-dlp executable for every call"""
+    
+    name = "Subprocess"
+    
+    def is_available(self) -> bool:
+        return True
+    
+    def list_videos(self, url: str, limit: int, options: Dict, start: int = 1) -> List[Tuple[str, str]]:
+        """List (id, title) pairs from a profile feed, entries start..limit"""
+        list_cmd = [
+            "yt-dlp",
+            "--flat-playlist",
+            "--print", "%(id)s %(title)s",
+            "--playlist-start", str(start),
+            "--playlist-end", str(limit)
+        ]
+        
+        # Add SSL bypass if enabled
+        if options.get('ssl_bypass'):
+            list_cmd.append("--no-check-certificate")
+        
+        list_cmd.append(url)
+        
+        result = subprocess.run(list_cmd, capture_output=True, text=True, timeout=60)
+        if result.returncode != 0:
+            raise backend_error(result.stderr)
+        
+        entries = []
+        for line in result.stdout.strip().split('\n'):
+            if line.strip():
+                parts = line.split(' ', 1)
+                if len(parts) >= 2:
+                    entries.append((parts[0], parts[1]))
+        return entries
+    
+    def iter_videos(self, url: str, options: Dict, start: int = 1, end: Optional[int] = None,
+                    timeout: float = 120):
+        """Yield (id, title) pairs from a profile feed as yt-dlp prints them
+        
+        Lists entries start..end, or to the end of the feed when end is None.
+        There is no overall deadline, only an idle one: yt-dlp is killed if it
+        prints nothing for `timeout` seconds while we are waiting on it.
+        Closing the generator early stops yt-dlp.
+        """
+        list_cmd = [
+            "yt-dlp",
+            "--flat-playlist",
+            "--print", "%(id)s %(title)s",
+            "--playlist-start", str(start)
+        ]
+        if end:
+            list_cmd.extend(["--playlist-end", str(end)])
+        if options.get('ssl_bypass'):
+            list_cmd.append("--no-check-certificate")
+        list_cmd.append(url)
+        
+        with tempfile.TemporaryFile('w+', encoding='utf-8', errors='replace') as stderr:
+            process = subprocess.Popen(list_cmd, stdout=subprocess.PIPE, stderr=stderr, text=True, bufsize=1)
+            # Set while we are blocked reading; a consumer busy with downloads doesn't count as idle
+            waiting_since = [time.monotonic()]
+            timed_out = threading.Event()
+            
+            def watchdog():
+                while process.poll() is None:
+                    since = waiting_since[0]
+                    if since is not None and time.monotonic() - since > timeout:
+                        timed_out.set()
+                        process.kill()
+                        return
+                    time.sleep(1)
+            
+            threading.Thread(target=watchdog, daemon=True).start()
+            try:
+                for line in process.stdout:
+                    waiting_since[0] = None
+                    parts = line.rstrip('\n').split(' ', 1)
+                    if len(parts) == 2 and parts[0]:
+                        yield parts[0], parts[1]
+                    waiting_since[0] = time.monotonic()
+                process.wait()
+            finally:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+                process.stdout.close()
+            
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(list_cmd, timeout)
+            if process.returncode != 0:
+                stderr.seek(0)
+                raise backend_error(stderr.read())
+    
+    def download(self, url: str, output_template: str, options: Dict, progress=None,
+                 timeout: float = 120) -> Tuple[Optional[str], Optional[Dict]]:
+        """Download a single video to the given output template
+        
+        Returns the final file path yt-dlp reports after moving the download
+        into place, and the info dict if it was asked for.
+        """
+        completed, errors, output_tail = self.run_download([url], output_template, options, progress, timeout)
+        if completed:
+            return next(iter(completed.values()))
+        if errors:
+            raise backend_error(output_tail)
+        return None, None
+    
+    def download_many(self, urls: List[str], output_template: str, options: Dict, progress=None,
+                      timeout: float = 120) -> Tuple[Dict[str, Tuple[Optional[str], Optional[Dict]]], Dict[str, str]]:
+        """Download several videos in one yt-dlp invocation through a batch file
+        
+        One process means one extractor setup and one HTTP session reused
+        across the whole chunk. Returns (completed, errors): video ID to
+        (path, info) for every video yt-dlp finished, and video ID to
+        error message for those it reported failing (under "" when it is
+        not tied to one video). A call that times out after some videos
+        finished still returns them, with the timeout reported under "".
+        """
+        with tempfile.NamedTemporaryFile('w', suffix=".txt", prefix="tikstalk-batch-", delete=False) as f:
+            f.write("\n".join(urls) + "\n")
+            batch_file = f.name
+        try:
+            completed, errors, _ = self.run_download(["--batch-file", batch_file, "--ignore-errors"],
+                                                     output_template, options, progress, timeout)
+        finally:
+            os.remove(batch_file)
+        return completed, errors
+    
+    def run_download(self, targets: List[str], output_template: str, options: Dict, progress=None,
+                     timeout: float = 120):
+        """Run yt-dlp for the given URLs or batch-file arguments
+        
+        Output is read line by line as yt-dlp prints it; progress lines are
+        passed to `progress` as events and only a short tail of everything
+        else is kept for error messages. Returns (completed, errors, output
+        tail) as described in download_many.
+        """
+        download_cmd = [
+            "yt-dlp",
+            "--format", options['format'],
+            "--output", output_template,
+            "--no-warnings",
+            "--newline",
+            "--progress-template", PROGRESS_TEMPLATE,
+            # --print implies --quiet, so progress has to be asked for explicitly
+            "--print", f"after_move:{OUTPUT_TEMPLATE}",
+            "--progress"
+        ]
+        
+        # Add SSL bypass if enabled
+        if options.get('ssl_bypass'):
+            download_cmd.append("--no-check-certificate")
+        
+        # Sidecars, thumbnails and catalog rows are written later from this line
+        if options.get('info') == 'full':
+            download_cmd.extend(["--print", f"after_move:{FULL_METADATA_TEMPLATE}"])
+        elif options.get('info'):
+            download_cmd.extend(["--print", f"after_move:{METADATA_TEMPLATE}"])
+        if options.get('concurrent_fragments'):
+            download_cmd.extend(["--concurrent-fragments", str(options['concurrent_fragments'])])
+        if options.get('sleep_interval'):
+            download_cmd.extend(["--sleep-interval", f"{options['sleep_interval']:.2f}"])
+        
+        download_cmd.extend(targets)
+        
+        process = subprocess.Popen(download_cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, bufsize=1)
+        timed_out = threading.Event()
+        
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+        
+        watchdog = threading.Timer(timeout, kill_on_timeout)
+        watchdog.start()
+        output_tail = deque(maxlen=20)
+        completed = {}
+        metadata = {}
+        errors = {}
+        try:
+            for line in process.stdout:
+                if line.startswith(OUTPUT_PREFIX):
+                    video_id, _, path = line[len(OUTPUT_PREFIX):].strip().partition(" ")
+                    completed[video_id] = path
+                    continue
+                if line.startswith(METADATA_PREFIX):
+                    try:
+                        info = json.loads(line[len(METADATA_PREFIX):])
+                        metadata[str(info.get('id'))] = info
+                    except ValueError:
+                        pass
+                    continue
+                event = parse_progress_line(line.strip())
+                if event is not None:
+                    if progress:
+                        progress(event)
+                    continue
+                output_tail.append(line)
+                error = ERROR_LINE.match(line)
+                if error:
+                    errors[error.group(1)] = error.group(2).strip()
+            process.wait()
+        finally:
+            watchdog.cancel()
+            process.stdout.close()
+        
+        if timed_out.is_set():
+            if not completed:
+                raise subprocess.TimeoutExpired(download_cmd, timeout)
+            # Keep the videos that were moved into place before the kill
+            errors[""] = f"timed out after {timeout:.0f}s"
+        if process.returncode != 0 and not completed and not errors:
+            errors[""] = "".join(output_tail)
+        return ({video_id: (path, metadata.get(video_id)) for video_id, path in completed.items()},
+                errors, "".join(output_tail))
+
+
+class InProcessBackend:
+    """yt-dlp engine that drives yt_dlp.YoutubeDL inside this process
+    
+    Every worker thread keeps one long-lived YoutubeDL per option set, so
+    extractor setup and the HTTP session (and its open connections) are
+    reused from one video to the next instead of paid per call.
+    """
+    
+    name = "In-process"
+    
+    def __init__(self):
+        self.local = threading.local()
+    
+    def is_available(self) -> bool:
+        return yt_dlp is not None or importlib.util.find_spec("yt_dlp") is not None
+    
+    def progress_hook(self, status: Dict):
+        """Forward yt-dlp progress hook calls to the current download's callback"""
+        callback = getattr(self.local, 'progress', None)
+        if callback and status.get('status') == 'downloading':
+            callback(make_progress_event(status))
+    
+    def post_hook(self, filepath: str):
+        """Remember the final path of the current download once yt-dlp has moved it"""
+        self.local.output_path = filepath
+    
+    def get_ydl(self, params: Dict):
+        """Return this thread's YoutubeDL instance for the given options"""
+        instances = getattr(self.local, 'instances', None)
+        if instances is None:
+            instances = self.local.instances = {}
+        key = tuple(sorted(params.items()))
+        ydl = instances.get(key)
+        if ydl is None:
+            ydl = load_yt_dlp().YoutubeDL(dict(params, quiet=True, no_warnings=True, noprogress=True,
+                                        progress_hooks=[self.progress_hook],
+                                        post_hooks=[self.post_hook]))
+            instances[key] = ydl
+        return ydl
+    
+    def list_videos(self, url: str, limit: int, options: Dict, start: int = 1) -> List[Tuple[str, str]]:
+        """List (id, title) pairs from a profile feed, entries start..limit"""
+        ydl = self.get_ydl({
+            'extract_flat': 'in_playlist',
+            'nocheckcertificate': bool(options.get('ssl_bypass'))
+        })
+        ydl.params['playliststart'] = start
+        ydl.params['playlistend'] = limit
+        try:
+            info = ydl.extract_info(url, download=False)
+        except yt_dlp.utils.YoutubeDLError as e:
+            raise backend_error(str(e))
+        
+        entries = []
+        for entry in (info or {}).get('entries') or []:
+            if entry and entry.get('id'):
+                entries.append((entry['id'], entry.get('title') or "NA"))
+        return entries
+    
+    def iter_videos(self, url: str, options: Dict, start: int = 1, end: Optional[int] = None,
+                    timeout: float = 120):
+        """Yield (id, title) pairs from a profile feed, entries start..end, as pages arrive
+        
+        The playlist is extracted without processing, so yt-dlp fetches each
+        page only when the entries before it have been consumed.
+        """
+        ydl = self.get_ydl({
+            'extract_flat': 'in_playlist',
+            'nocheckcertificate': bool(options.get('ssl_bypass'))
+        })
+        try:
+            info = ydl.extract_info(url, download=False, process=False)
+            for entry in itertools.islice((info or {}).get('entries') or [], start - 1, end):
+                if entry and entry.get('id'):
+                    yield entry['id'], entry.get('title') or "NA"
+        except yt_dlp.utils.YoutubeDLError as e:
+            raise backend_error(str(e))
+    
+    def download(self, url: str, output_template: str, options: Dict, progress=None,
+                 timeout: float = 120) -> Tuple[Optional[str], Optional[Dict]]:
+        """Download a single video to the given output template
+        
+        Returns the final file path and, if asked for, the info dict.
+        """
+        ydl = self.get_ydl({
+            'format': options['format'],
+            'nocheckcertificate': bool(options.get('ssl_bypass'))
+        })
+        ydl.params['outtmpl'] = {'default': output_template}
+        self.local.progress = progress
+        self.local.output_path = None
+        try:
+            info = ydl.extract_info(url, download=True)
+        except yt_dlp.utils.YoutubeDLError as e:
+            raise backend_error(str(e))
+        finally:
+            self.local.progress = None
+        if info is None:
+            raise BackendError("yt-dlp returned no video")
+        if not options.get('info'):
+            return self.local.output_path, None
+        info = ydl.sanitize_info(info)
+        if options['info'] != 'full':
+            info = {field: info.get(field) for field in INFO_FIELDS}
+        return self.local.output_path, info
+
+
+class SQLiteStore:
+    """Base for the stores kept as tables in the shared download database
+    
+    Each store opens its own WAL-mode connection, usable from any thread
+    behind `self.lock`, and creates its tables in create_tables().
+    """
+    
+    def __init__(self, db_path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.create_tables()
+        self.conn.commit()
+    
+    def create_tables(self):
+        """Create this store's tables and indexes if they don't exist yet"""
+    
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class DownloadJournal(SQLiteStore):
+    """Write-ahead journal of in-flight download jobs
+    
+    Every video is recorded as queued before work starts and moves through
+    downloading -> downloaded -> converting; finished jobs are deleted. After
+    a crash the rows left behind say exactly what still needs doing.
+    """
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "username TEXT, video_id TEXT, title TEXT, hash TEXT, state TEXT, conversion TEXT, "
+            "input_path TEXT, output_path TEXT, updated_at REAL, PRIMARY KEY (username, video_id))"
+        )
+    
+    def enqueue(self, username: str, videos: List[Dict], conversion: str):
+        """Record a batch of videos as queued"""
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, 'queued', ?, NULL, NULL, ?)",
+                ((username, v['id'], v['title'], v['hash'], conversion, now) for v in videos)
+            )
+            self.conn.commit()
+    
+    def set_state(self, username: str, video_id: str, state: str,
+                  input_path: Optional[str] = None, output_path: Optional[str] = None):
+        """Move a job to a new state"""
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, input_path = COALESCE(?, input_path), "
+                "output_path = COALESCE(?, output_path), updated_at = ? WHERE username = ? AND video_id = ?",
+                (state, input_path, output_path, time.time(), username, video_id)
+            )
+            self.conn.commit()
+    
+    def remove(self, username: str, video_id: str):
+        """Forget a finished (or abandoned) job"""
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE username = ? AND video_id = ?", (username, video_id))
+            self.conn.commit()
+    
+    def pending(self) -> List[Dict]:
+        """Jobs left unfinished, oldest first"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "SELECT username, video_id, title, hash, state, conversion, input_path, output_path "
+                "FROM jobs ORDER BY updated_at"
+            )
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+# Job priorities; lower values run first
+JOB_PRIORITIES = {'manual': 0, 'monitor': 10}
+
+
+class JobQueue(SQLiteStore):
+    """Persistent priority queue of account download jobs
+    
+    Jobs live in the `queue` table, so whatever was queued or running when
+    the app exited is picked up again on the next start. Manual downloads
+    jump ahead of monitor refills, an account has at most one queued job,
+    and two jobs for the same account never run at once.
+    """
+    
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.condition = threading.Condition(self.lock)
+        self.running = True
+        self.closed = False
+        self.version = 0  # bumped on every change, so front ends know when to redraw
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS queue (id INTEGER PRIMARY KEY AUTOINCREMENT, username TEXT, "
+            "priority INTEGER, source TEXT, incremental INTEGER, state TEXT, added_at REAL, started_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS queue_order ON queue (state, priority, id)")
+    
+    def changed(self):
+        """Commit and wake waiters; call with the condition held"""
+        self.conn.commit()
+        self.version += 1
+        self.condition.notify_all()
+    
+    def push(self, username: str, source: str, incremental: bool = False,
+             priority: Optional[int] = None) -> int:
+        """Queue a job for an account, merging with one already queued, and return its ID"""
+        if priority is None:
+            priority = JOB_PRIORITIES[source]
+        with self.condition:
+            row = self.conn.execute("SELECT id, priority, incremental FROM queue "
+                                    "WHERE username = ? AND state = 'queued'", (username,)).fetchone()
+            if row:
+                job_id = row[0]
+                # The merged job keeps the higher priority and the fuller listing
+                if priority < row[1]:
+                    self.conn.execute("UPDATE queue SET priority = ?, source = ? WHERE id = ?",
+                                      (priority, source, job_id))
+                if row[2] and not incremental:
+                    self.conn.execute("UPDATE queue SET incremental = 0 WHERE id = ?", (job_id,))
+            else:
+                cursor = self.conn.execute(
+                    "INSERT INTO queue (username, priority, source, incremental, state, added_at) "
+                    "VALUES (?, ?, ?, ?, 'queued', ?)", (username, priority, source, int(incremental), time.time())
+                )
+                job_id = cursor.lastrowid
+            self.changed()
+        return job_id
+    
+    def take(self) -> Optional[Dict]:
+        """Block until a job can run and mark it running; None once stopped"""
+        with self.condition:
+            while self.running:
+                row = self.conn.execute(
+                    "SELECT id, username, priority, source, incremental FROM queue WHERE state = 'queued' "
+                    "AND username NOT IN (SELECT username FROM queue WHERE state = 'running') "
+                    "ORDER BY priority, id LIMIT 1"
+                ).fetchone()
+                if row:
+                    self.conn.execute("UPDATE queue SET state = 'running', started_at = ? WHERE id = ?",
+                                      (time.time(), row[0]))
+                    self.changed()
+                    return dict(zip(('id', 'username', 'priority', 'source', 'incremental'), row))
+                self.condition.wait()
+        return None
+    
+    def finish(self, job_id: int):
+        """Remove a job once it has run"""
+        with self.condition:
+            if not self.closed:
+                self.conn.execute("DELETE FROM queue WHERE id = ?", (job_id,))
+                self.changed()
+    
+    def cancel(self, job_id: int) -> bool:
+        """Drop a queued job; running jobs are left alone"""
+        with self.condition:
+            cancelled = self.conn.execute("DELETE FROM queue WHERE id = ? AND state = 'queued'",
+                                          (job_id,)).rowcount
+            self.changed()
+        return bool(cancelled)
+    
+    def cancel_source(self, source: str) -> int:
+        """Drop every queued job from one source, returning how many"""
+        with self.condition:
+            cancelled = self.conn.execute("DELETE FROM queue WHERE source = ? AND state = 'queued'",
+                                          (source,)).rowcount
+            self.changed()
+        return cancelled
+    
+    def reprioritise(self, job_id: int, priority: int) -> bool:
+        """Change a queued job's priority"""
+        with self.condition:
+            updated = self.conn.execute("UPDATE queue SET priority = ? WHERE id = ? AND state = 'queued'",
+                                        (priority, job_id)).rowcount
+            self.changed()
+        return bool(updated)
+    
+    def first_priority(self) -> int:
+        """Priority of the job that would run next"""
+        with self.condition:
+            row = self.conn.execute("SELECT MIN(priority) FROM queue WHERE state = 'queued'").fetchone()
+        return row[0] if row[0] is not None else JOB_PRIORITIES['manual']
+    
+    def jobs(self) -> List[Dict]:
+        """Running jobs, then queued jobs in the order they will run"""
+        with self.condition:
+            cursor = self.conn.execute(
+                "SELECT id, username, priority, source, incremental, state, added_at, started_at FROM queue "
+                "ORDER BY state = 'queued', priority, id"
+            )
+            columns = [c[0] for c in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs in each state"""
+        with self.condition:
+            return dict(self.conn.execute("SELECT state, COUNT(*) FROM queue GROUP BY state").fetchall())
+    
+    def wait(self, job_id: int):
+        """Block until a job has finished or been cancelled"""
+        with self.condition:
+            while not self.closed and self.conn.execute("SELECT 1 FROM queue WHERE id = ?",
+                                                        (job_id,)).fetchone():
+                self.condition.wait()
+    
+    def restore(self) -> int:
+        """Requeue jobs that were running when the app last exited, returning how many jobs are waiting"""
+        with self.condition:
+            self.conn.execute("UPDATE queue SET state = 'queued' WHERE state = 'running'")
+            self.changed()
+            return self.conn.execute("SELECT COUNT(*) FROM queue").fetchone()[0]
+    
+    def stop(self):
+        """Stop handing out jobs; running jobs finish on their own"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+    
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.conn.close()
+            self.condition.notify_all()
+
+
+class ListingCheckpoints(SQLiteStore):
+    """How far an unfinished full listing of each account got
+    
+    A row holds the feed position up to which every entry is either known
+    or journaled, plus the newest ID seen and how many downloads failed, so
+    a paused or interrupted backfill continues where it stopped.
+    """
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS listing_checkpoints (username TEXT PRIMARY KEY, position INTEGER, "
+            "newest_id INTEGER, failed INTEGER, updated_at REAL)"
+        )
+    
+    def get(self, username: str) -> Optional[Dict]:
+        with self.lock:
+            row = self.conn.execute("SELECT position, newest_id, failed FROM listing_checkpoints "
+                                    "WHERE username = ?", (username,)).fetchone()
+        return dict(zip(('position', 'newest_id', 'failed'), row)) if row else None
+    
+    def set(self, username: str, position: int, newest_id: Optional[int], failed: int):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO listing_checkpoints VALUES (?, ?, ?, ?, ?)",
+                              (username, position, newest_id, failed, time.time()))
+            self.conn.commit()
+    
+    def remove(self, username: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM listing_checkpoints WHERE username = ?", (username,))
+            self.conn.commit()
+    
+    def all(self) -> Dict[str, int]:
+        """Username to checkpointed position"""
+        with self.lock:
+            return dict(self.conn.execute("SELECT username, position FROM listing_checkpoints").fetchall())
+
+
+class PostprocessJournal(SQLiteStore):
+    """Downloads whose thumbnail, sidecar and catalog row are still to be written
+    
+    The download itself is already finished and out of the job journal by
+    the time post-processing runs, so the info dict is kept here until the
+    follow-up work is done. Rows left behind by an exit or crash are
+    submitted again on the next start.
+    """
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS postprocess (username TEXT, video_id TEXT, output_path TEXT, "
+            "info TEXT, added_at REAL, PRIMARY KEY (username, video_id))"
+        )
+    
+    def add(self, username: str, video_id: str, output_path: Optional[str], info: Dict):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO postprocess VALUES (?, ?, ?, ?, ?)",
+                              (username, video_id, output_path, json.dumps(info), time.time()))
+            self.conn.commit()
+    
+    def remove(self, username: str, video_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM postprocess WHERE username = ? AND video_id = ?", (username, video_id))
+            self.conn.commit()
+    
+    def pending(self) -> List[Tuple[str, str, Optional[str], Dict]]:
+        """(username, video_id, output_path, info) rows, oldest first"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT username, video_id, output_path, info FROM postprocess ORDER BY added_at").fetchall()
+        return [(username, video_id, output_path, json.loads(info)) for username, video_id, output_path, info in rows]
+
+
+class ContentStore(SQLiteStore):
+    """Content-hash index of stored media, used to collapse duplicate files
+    
+    Files are hashed in fixed-size chunks, so memory use does not depend on
+    file size. The digest is the primary key, so checking whether identical
+    bytes are already held is a single indexed lookup.
+    """
+    
+    chunk_size = 1024 * 1024
+    
+    def create_tables(self):
+        self.conn.execute("CREATE TABLE IF NOT EXISTS content (digest TEXT PRIMARY KEY, size INTEGER, path TEXT)")
+    
+    def hash_file(self, path: str) -> str:
+        """SHA-256 of a file, read in chunks"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    
+    def find(self, digest: str) -> Optional[str]:
+        """Path of a stored file with this digest, if any"""
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM content WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+    
+    def record(self, digest: str, size: int, path: str):
+        """Remember where the canonical copy of some content lives"""
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO content VALUES (?, ?, ?)", (digest, size, path))
+            self.conn.commit()
+
+
+class OutputManifest(SQLiteStore):
+    """Exact paths, sizes and ages of the media files each download produced
+    
+    Backends report the final path yt-dlp wrote, so conversion, dedup and
+    resume look the file up here instead of scanning the user's folder. The
+    same rows drive retention: sizes and ages are indexed, so quota checks
+    are aggregate queries rather than walks over the download tree. Rows
+    whose media files are hardlinks of one another (see dedup_content)
+    share a `file_key` and are counted once.
+    """
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS manifest ("
+            "username TEXT, video_id TEXT, path TEXT, PRIMARY KEY (username, video_id))"
+        )
+        # Retention columns, added in place to manifests created before them
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(manifest)")}
+        for column, kind in (('size', 'INTEGER DEFAULT 0'), ('added_at', 'REAL'), ('accessed_at', 'REAL'),
+                             ('file_key', 'TEXT')):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE manifest ADD COLUMN {column} {kind}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS manifest_user_added ON manifest (username, added_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS manifest_added ON manifest (added_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS manifest_accessed ON manifest (accessed_at)")
+    
+    def set(self, username: str, video_id: str, path: str, size: Optional[int] = None,
+            added_at: Optional[float] = None):
+        """Record where a video's media file lives and how much space it takes"""
+        if size is None:
+            size = media_footprint(path)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO manifest (username, video_id, path, size, added_at, accessed_at, file_key) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (username, video_id) DO UPDATE SET "
+                "path = excluded.path, size = excluded.size, accessed_at = excluded.accessed_at, "
+                "file_key = excluded.file_key",
+                (username, video_id, path, size, added_at or now, now, file_key(path))
+            )
+            self.conn.commit()
+    
+    def get(self, username: str, video_id: str) -> Optional[str]:
+        """Recorded media path for a video, if any"""
+        with self.lock:
+            row = self.conn.execute("SELECT path FROM manifest WHERE username = ? AND video_id = ?",
+                                    (username, video_id)).fetchone()
+        return row[0] if row else None
+    
+    def remove(self, username: str, video_id: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM manifest WHERE username = ? AND video_id = ?", (username, video_id))
+            self.conn.commit()
+    
+    # One group per stored file: hardlinked rows share a file_key, other rows stand alone
+    stored_file = "COALESCE(file_key, username || '/' || video_id)"
+    
+    def total_size(self) -> int:
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT COALESCE(SUM(size), 0) FROM "
+                f"(SELECT MAX(size) AS size FROM manifest GROUP BY {self.stored_file})").fetchone()[0]
+    
+    def user_sizes(self) -> Dict[str, int]:
+        """Bytes stored per user"""
+        with self.lock:
+            return dict(self.conn.execute(
+                f"SELECT username, SUM(size) FROM (SELECT username, MAX(size) AS size FROM manifest "
+                f"GROUP BY username, {self.stored_file}) GROUP BY username"))
+    
+    def oldest(self, order: str = 'added_at', username: Optional[str] = None, limit: int = 100) -> List[Tuple]:
+        """(username, video_id, path, size) rows, least recently added or accessed first"""
+        column = 'accessed_at' if order == 'accessed_at' else 'added_at'
+        where, params = ("WHERE username = ?", [username]) if username else ("", [])
+        with self.lock:
+            return self.conn.execute(
+                f"SELECT username, video_id, path, size FROM manifest {where} ORDER BY {column} LIMIT ?",
+                params + [limit]).fetchall()
+    
+    def older_than(self, cutoff: float, limit: int = 100) -> List[Tuple]:
+        """Rows added before the cutoff timestamp"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT username, video_id, path, size FROM manifest WHERE added_at < ? ORDER BY added_at LIMIT ?",
+                (cutoff, limit)).fetchall()
+    
+    def beyond_newest(self, keep: int) -> List[Tuple]:
+        """Rows past each user's `keep` most recent downloads"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT username, video_id, path, size FROM ("
+                "SELECT *, ROW_NUMBER() OVER (PARTITION BY username ORDER BY added_at DESC) AS position "
+                "FROM manifest) WHERE position > ?", (keep,)).fetchall()
+    
+    def page(self, after: Tuple[str, str], limit: int = 500) -> List[Tuple]:
+        """(username, video_id, path) rows in key order, for incremental refreshes"""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT username, video_id, path FROM manifest WHERE (username, video_id) > (?, ?) "
+                "ORDER BY username, video_id LIMIT ?", (after[0], after[1], limit)).fetchall()
+    
+    def update_stats(self, rows: List[Tuple[int, str, float, str, str]]):
+        """Apply (size, file_key, accessed_at, username, video_id) refreshes"""
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE manifest SET size = ?, file_key = ?, accessed_at = MAX(COALESCE(accessed_at, 0), ?) "
+                "WHERE username = ? AND video_id = ?", rows)
+            self.conn.commit()
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM manifest").fetchone()[0]
+
+
+class MetadataCatalog(SQLiteStore):
+    """Compact SQLite catalog of video metadata
+    
+    One row per video with the fields worth querying indexed, so questions
+    across the whole archive don't mean opening every .info.json sidecar.
+    Rows are upserted, so re-downloads and re-imports just refresh them.
+    """
+    
+    columns = ('username', 'video_id', 'title', 'uploader', 'upload_date', 'timestamp', 'duration',
+               'view_count', 'like_count', 'comment_count', 'repost_count', 'description', 'updated_at')
+    sort_columns = ('upload_date', 'timestamp', 'duration', 'view_count', 'like_count', 'comment_count')
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS catalog ("
+            "username TEXT, video_id TEXT, title TEXT, uploader TEXT, upload_date TEXT, timestamp INTEGER, "
+            "duration REAL, view_count INTEGER, like_count INTEGER, comment_count INTEGER, "
+            "repost_count INTEGER, description TEXT, updated_at REAL, PRIMARY KEY (username, video_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS catalog_video ON catalog (video_id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS catalog_user_date ON catalog (username, upload_date)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS catalog_date ON catalog (upload_date)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS catalog_duration ON catalog (duration)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS catalog_views ON catalog (view_count)")
+    
+    def make_row(self, username: str, metadata: Dict, updated_at: Optional[float] = None) -> Tuple:
+        return (username, str(metadata.get('id')), metadata.get('title'), metadata.get('uploader'),
+                metadata.get('upload_date'), metadata.get('timestamp'), metadata.get('duration'),
+                metadata.get('view_count'), metadata.get('like_count'), metadata.get('comment_count'),
+                metadata.get('repost_count'), metadata.get('description'), updated_at or time.time())
+    
+    def add(self, username: str, metadata: Dict, updated_at: Optional[float] = None):
+        """Insert or refresh one video's metadata"""
+        self.add_many([self.make_row(username, metadata, updated_at)])
+    
+    def add_many(self, rows: List[Tuple]):
+        """Insert or refresh many rows built by make_row in one transaction"""
+        placeholders = ", ".join("?" * len(self.columns))
+        with self.lock:
+            self.conn.executemany(f"INSERT OR REPLACE INTO catalog VALUES ({placeholders})", rows)
+            self.conn.commit()
+    
+    def updated_at(self, username: str) -> Dict[str, float]:
+        """When each of a user's rows was last written, by video ID"""
+        with self.lock:
+            rows = self.conn.execute("SELECT video_id, updated_at FROM catalog WHERE username = ?",
+                                     (username,)).fetchall()
+        return dict(rows)
+    
+    def query(self, username: Optional[str] = None, since: Optional[str] = None, until: Optional[str] = None,
+              min_views: Optional[int] = None, order_by: str = 'upload_date', limit: int = 50) -> List[Dict]:
+        """Find videos by user, upload date range (YYYYMMDD) and views, newest or largest first"""
+        if order_by not in self.sort_columns:
+            raise ValueError(f"order_by must be one of: {', '.join(self.sort_columns)}")
+        
+        clauses, params = [], []
+        if username:
+            clauses.append("username = ?")
+            params.append(username)
+        if since:
+            clauses.append("upload_date >= ?")
+            params.append(since)
+        if until:
+            clauses.append("upload_date <= ?")
+            params.append(until)
+        if min_views is not None:
+            clauses.append("view_count >= ?")
+            params.append(min_views)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        
+        with self.lock:
+            cursor = self.conn.execute(
+                f"SELECT * FROM catalog {where} ORDER BY {order_by} DESC LIMIT ?", params + [limit])
+            return [dict(zip(self.columns, row)) for row in cursor.fetchall()]
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM catalog").fetchone()[0]
+
+
+class ThumbnailStore(SQLiteStore):
+    """Size-capped SQLite cache of compact thumbnails
+    
+    One shared table instead of an image file per video; once the cache
+    outgrows its cap the oldest thumbnails are dropped first.
+    """
+    
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        self.total = None  # bytes stored, summed on first use
+    
+    def create_tables(self):
+        # size comes before data so totals never have to read the image pages
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS thumbnails (username TEXT, video_id TEXT, mime TEXT, size INTEGER, "
+            "added_at REAL, data BLOB, PRIMARY KEY (username, video_id))"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS thumbnails_added ON thumbnails (added_at)")
+    
+    def total_size(self) -> int:
+        with self.lock:
+            if self.total is None:
+                self.total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM thumbnails").fetchone()[0]
+            return self.total
+    
+    def put(self, username: str, video_id: str, data: bytes, mime: str):
+        """Store (or replace) a video's thumbnail"""
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM thumbnails WHERE username = ? AND video_id = ?",
+                                    (username, video_id)).fetchone()
+            self.conn.execute("INSERT OR REPLACE INTO thumbnails VALUES (?, ?, ?, ?, ?, ?)",
+                              (username, video_id, mime, len(data), time.time(), sqlite3.Binary(data)))
+            self.conn.commit()
+            if self.total is not None:
+                self.total += len(data) - (old[0] if old else 0)
+    
+    def get(self, username: str, video_id: str) -> Optional[Tuple[bytes, str]]:
+        """A video's thumbnail as (data, mime type), if cached"""
+        with self.lock:
+            row = self.conn.execute("SELECT data, mime FROM thumbnails WHERE username = ? AND video_id = ?",
+                                    (username, video_id)).fetchone()
+        return (bytes(row[0]), row[1]) if row else None
+    
+    def keys(self, username: Optional[str] = None) -> List[Tuple[str, str]]:
+        """(username, video ID) of every cached thumbnail"""
+        with self.lock:
+            if username:
+                return self.conn.execute("SELECT username, video_id FROM thumbnails WHERE username = ?",
+                                         (username,)).fetchall()
+            return self.conn.execute("SELECT username, video_id FROM thumbnails").fetchall()
+    
+    def remove(self, username: str, video_id: str):
+        with self.lock:
+            old = self.conn.execute("SELECT size FROM thumbnails WHERE username = ? AND video_id = ?",
+                                    (username, video_id)).fetchone()
+            self.conn.execute("DELETE FROM thumbnails WHERE username = ? AND video_id = ?", (username, video_id))
+            self.conn.commit()
+            if self.total is not None and old:
+                self.total -= old[0]
+    
+    def trim(self, max_bytes: float) -> int:
+        """Drop the oldest thumbnails until the cache fits in max_bytes, returning how many"""
+        removed = 0
+        while self.total_size() > max_bytes:
+            with self.lock:
+                rows = self.conn.execute("SELECT username, video_id, size FROM thumbnails "
+                                         "ORDER BY added_at LIMIT 100").fetchall()
+                if not rows:
+                    break
+                for username, video_id, size in rows:
+                    self.conn.execute("DELETE FROM thumbnails WHERE username = ? AND video_id = ?",
+                                      (username, video_id))
+                    self.total -= size
+                    removed += 1
+                    if self.total <= max_bytes:
+                        break
+                self.conn.commit()
+        return removed
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM thumbnails").fetchone()[0]
+
+
+class DownloadIndex(SQLiteStore):
+    """SQLite-backed record of downloaded videos
+    
+    Rows are keyed by the duplicate-check hash and indexed by user and video
+    ID, so membership checks and inserts are O(1)-ish and never rewrite the
+    whole history the way the old JSON list did.
+    """
+    
+    def __init__(self, db_path: str):
+        super().__init__(db_path)
+        # Counting scans the whole table, so it waits until someone asks
+        self.count = None
+    
+    def create_tables(self):
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS downloads ("
+            "hash TEXT PRIMARY KEY, username TEXT, video_id TEXT, title TEXT, downloaded_at REAL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS downloads_user_video ON downloads (username, video_id)")
+    
+    def __len__(self):
+        with self.lock:
+            if self.count is None:
+                self.count = self.conn.execute("SELECT COUNT(*) FROM downloads").fetchone()[0]
+            return self.count
+    
+    def adjust_count(self, change: int):
+        """Keep a loaded count in step with inserts and deletes; call with the lock held"""
+        if self.count is not None:
+            self.count += change
+    
+    def contains(self, video_hash: str, username: Optional[str] = None, video_id: Optional[str] = None) -> bool:
+        """Check by hash, or by user and video ID so title edits are still caught"""
+        with self.lock:
+            row = self.conn.execute("SELECT 1 FROM downloads WHERE hash = ?", (video_hash,)).fetchone()
+            if row is None and username and video_id:
+                row = self.conn.execute(
+                    "SELECT 1 FROM downloads WHERE username = ? AND video_id = ?", (username, video_id)
+                ).fetchone()
+        return row is not None
+    
+    def add(self, video_hash: str, username: Optional[str] = None, video_id: Optional[str] = None,
+            title: Optional[str] = None):
+        """Record a downloaded video"""
+        with self.lock:
+            cursor = self.conn.execute(
+                "INSERT OR IGNORE INTO downloads VALUES (?, ?, ?, ?, ?)",
+                (video_hash, username, video_id, title, time.time())
+            )
+            self.conn.commit()
+            self.adjust_count(cursor.rowcount)
+    
+    def discard(self, video_hash: str):
+        """Forget one downloaded video"""
+        with self.lock:
+            cursor = self.conn.execute("DELETE FROM downloads WHERE hash = ?", (video_hash,))
+            self.conn.commit()
+            self.adjust_count(-cursor.rowcount)
+    
+    def import_hashes(self, hashes: List[str]) -> int:
+        """Bulk-insert legacy hashes that carry no user or video ID"""
+        with self.lock:
+            now = time.time()
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO downloads (hash, downloaded_at) VALUES (?, ?)",
+                ((h, now) for h in hashes)
+            )
+            self.conn.commit()
+            added = self.conn.total_changes - before
+            self.adjust_count(added)
+            return added
+    
+    def clear(self):
+        """Forget every downloaded video"""
+        with self.lock:
+            self.conn.execute("DELETE FROM downloads")
+            self.conn.commit()
+            self.count = 0
+
+
+class Metrics:
+    """In-process counters, latency histograms and on-demand gauges
+    
+    Recording is a dict update under one lock. Gauges are callables that
+    only run when a snapshot is taken, so nothing extra happens unless
+    something is actually reading the metrics.
+    """
+    
+    buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.started = time.time()
+    
+    @staticmethod
+    def series(name: str, labels: Dict) -> str:
+        """Prometheus-style series name, e.g. downloads_total{result="failed"}"""
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+    
+    def inc(self, name: str, value: float = 1, **labels):
+        """Add to a counter"""
+        series = self.series(name, labels)
+        with self.lock:
+            self.counters[series] = self.counters.get(series, 0) + value
+    
+    def observe(self, name: str, seconds: float, **labels):
+        """Record a latency in a histogram"""
+        series = self.series(name, labels)
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            histogram = self.histograms.get(series)
+            if histogram is None:
+                histogram = self.histograms[series] = {'name': name, 'labels': labels, 'sum': 0.0,
+                                                       'counts': [0] * (len(self.buckets) + 1)}
+            histogram['counts'][bucket] += 1
+            histogram['sum'] += seconds
+    
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Time a block into a histogram"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+    
+    def gauge(self, name: str, read):
+        """Register a callable read whenever a snapshot is taken"""
+        self.gauges[name] = read
+    
+    def snapshot(self) -> Dict:
+        """Everything recorded so far, as plain JSON-friendly data"""
+        gauges = {}
+        for name, read in list(self.gauges.items()):
+            try:
+                gauges[name] = read()
+            except Exception:
+                gauges[name] = None
+        
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {}
+            for series, histogram in self.histograms.items():
+                cumulative = list(itertools.accumulate(histogram['counts']))
+                histograms[series] = {
+                    'count': cumulative[-1],
+                    'sum': histogram['sum'],
+                    'buckets': dict(zip([str(le) for le in self.buckets] + ["+Inf"], cumulative))
+                }
+        return {'timestamp': time.time(), 'uptime': time.time() - self.started,
+                'counters': counters, 'histograms': histograms, 'gauges': gauges}
+    
+    def render_text(self) -> str:
+        """Prometheus text exposition of the current snapshot"""
+        with self.lock:
+            layout = {series: (histogram['name'], histogram['labels'])
+                      for series, histogram in self.histograms.items()}
+        snapshot = self.snapshot()
+        lines = []
+        for series, value in sorted(snapshot['counters'].items()):
+            lines.append(f"{series} {value}")
+        for name, value in sorted(snapshot['gauges'].items()):
+            if value is not None:
+                lines.append(f"{name} {value}")
+        for series, histogram in sorted(snapshot['histograms'].items()):
+            name, labels = layout[series]
+            for le, count in histogram['buckets'].items():
+                lines.append(f"{self.series(name + '_bucket', dict(labels, le=le))} {count}")
+            lines.append(f"{self.series(name + '_sum', labels)} {histogram['sum']}")
+            lines.append(f"{self.series(name + '_count', labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsExporter:
+    """Publishes Metrics on a local HTTP endpoint and/or as a periodic JSON snapshot file
+    
+    /metrics serves Prometheus text and /metrics.json the raw snapshot; the
+    server only binds to localhost.
+    """
+    
+    def __init__(self, metrics: Metrics, port: int = 0, snapshot_file: str = "",
+                 interval: float = 15, log=print):
+        self.metrics = metrics
+        self.port = port
+        self.snapshot_file = snapshot_file
+        self.interval = max(1, interval)
+        self.log = log
+        self.server = None
+        self.stop_event = threading.Event()
+        self.threads = []
+    
+    def start(self):
+        """Start whichever outputs are configured"""
+        if self.port:
+            metrics = self.metrics
+            
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path == "/metrics":
+                        body, content_type = metrics.render_text(), "text/plain; version=0.0.4"
+                    elif self.path == "/metrics.json":
+                        body, content_type = json.dumps(metrics.snapshot()), "application/json"
+                    else:
+                        self.send_error(404)
+                        return
+                    data = body.encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", content_type)
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                
+                def log_message(self, format, *args):
+                    pass
+            
+            self.server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+            self.server.daemon_threads = True
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if self.snapshot_file:
+            self.threads.append(threading.Thread(target=self.write_loop, daemon=True))
+        for thread in self.threads:
+            thread.start()
+    
+    def write_snapshot(self):
+        """Write the snapshot file atomically, so scrapers never read a partial file"""
+        temp_path = f"{self.snapshot_file}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.metrics.snapshot(), f, indent=2)
+            os.replace(temp_path, self.snapshot_file)
+        except OSError as e:
+            self.log(f"✗ Metrics snapshot error: {str(e)}")
+    
+    def write_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.write_snapshot()
+    
+    def stop(self):
+        """Stop serving and write a final snapshot"""
+        self.stop_event.set()
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for thread in self.threads:
+            thread.join()
+        if self.snapshot_file:
+            self.write_snapshot()
+
+
+class MonitorScheduler:
+    """Runs per-account monitor checks from a priority queue of due times
+    
+    Accounts sit in a heap ordered by next-due time and due checks run on a
+    bounded pool. First checks are staggered and later ones jittered, so many
+    accounts sharing an interval never hit TikTok in the same second.
+    """
+    
+    def __init__(self, check, max_concurrent: int = 2, log=print,
+                 retry_delay: float = 60, jitter: float = 0.1, spread_window: float = 300,
+                 metrics: Optional[Metrics] = None):
+        self.check = check
+        self.max_concurrent = max(1, max_concurrent)
+        self.log = log
+        self.metrics = metrics or Metrics()
+        self.retry_delay = retry_delay
+        self.jitter = jitter
+        self.spread_window = spread_window
+        self.accounts = {}
+        self.queue = []
+        self.counter = itertools.count()
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.running = True
+    
+    def set_accounts(self, accounts: Dict[str, float]):
+        """Replace the watched accounts, mapping username to interval in seconds"""
+        with self.condition:
+            self.accounts = dict(accounts)
+            self.queue = []
+            now = time.monotonic()
+            for i, (username, interval) in enumerate(self.accounts.items()):
+                offset = i * min(interval, self.spread_window) / len(self.accounts)
+                heapq.heappush(self.queue, (now + offset, next(self.counter), username))
+            self.condition.notify_all()
+    
+    def schedule(self, username: str, delay: float):
+        """Queue the next check for an account"""
+        with self.condition:
+            if self.running and username in self.accounts:
+                heapq.heappush(self.queue, (time.monotonic() + delay, next(self.counter), username))
+                self.condition.notify_all()
+    
+    def run_check(self, username: str):
+        """Run one account check and queue the following one"""
+        delay = self.accounts[username]
+        started = time.perf_counter()
+        try:
+            self.check(username)
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+            self.metrics.inc('tikstalk_monitor_checks_total', result='succeeded')
+        except Exception as e:
+            self.log(f"Monitoring error (@{username}): {str(e)}")
+            delay = self.retry_delay
+            self.metrics.inc('tikstalk_monitor_checks_total', result='failed')
+        finally:
+            self.metrics.observe('tikstalk_monitor_check_seconds', time.perf_counter() - started)
+            with self.condition:
+                self.in_flight -= 1
+                self.condition.notify_all()
+        self.schedule(username, delay)
+    
+    def next_due(self) -> Optional[str]:
+        """Wait for a due account and a free slot; None once stopped"""
+        waiting_since = time.monotonic()
+        with self.condition:
+            while self.running:
+                now = time.monotonic()
+                if self.in_flight >= self.max_concurrent or not self.queue:
+                    self.condition.wait()
+                elif self.queue[0][0] > now:
+                    self.condition.wait(self.queue[0][0] - now)
+                else:
+                    self.in_flight += 1
+                    due, _, username = heapq.heappop(self.queue)
+                    # Sleep time between dispatches, and how far past due the check starts
+                    self.metrics.observe('tikstalk_monitor_wait_seconds', now - waiting_since)
+                    self.metrics.observe('tikstalk_monitor_lateness_seconds', now - due)
+                    return username
+        return None
+    
+    def run(self):
+        """Dispatch due checks until stop() is called"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as executor:
+            while True:
+                username = self.next_due()
+                if username is None:
+                    break
+                executor.submit(self.run_check, username)
+    
+    def stop(self):
+        """Stop dispatching; checks already running are allowed to finish"""
+        with self.condition:
+            self.running = False
+            self.queue = []
+            self.condition.notify_all()
+
+
+class ConversionPipeline:
+    """Background FFmpeg stage fed by the download workers
+    
+    Each worker thread supervises one FFmpeg process, so transcodes run in
+    parallel with (and independently of) network transfers. The queue is
+    bounded: once it is full, submit() blocks the downloader that called it.
+    """
+    
+    def __init__(self, convert, workers: Optional[int] = None, max_pending: Optional[int] = None, log=print):
+        self.convert = convert
+        self.workers = workers or os.cpu_count() or 1
+        self.queue = queue.Queue(maxsize=max_pending or self.workers * 4)
+        self.log = log
+        self.threads = []
+        self.lock = threading.Lock()
+    
+    @property
+    def pending(self) -> int:
+        """Queued plus in-progress conversions"""
+        return self.queue.unfinished_tasks
+    
+    def start(self):
+        """Start the worker threads on first use"""
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.worker, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def worker(self):
+        while True:
+            input_path, output_path, conversion_options, on_done = self.queue.get()
+            try:
+                result = self.convert(input_path, output_path, conversion_options)
+                if on_done:
+                    on_done(result)
+            except Exception as e:
+                self.log(f"✗ Conversion error: {str(e)}")
+            finally:
+                self.queue.task_done()
+    
+    def submit(self, input_path: str, output_path: str, conversion_options: Dict, on_done=None):
+        """Queue a conversion, blocking while the queue is full"""
+        self.start()
+        if self.queue.full():
+            self.log(f"Conversion queue full ({self.queue.maxsize}), waiting...")
+        self.queue.put((input_path, output_path, conversion_options, on_done))
+    
+    def drain(self):
+        """Block until every queued conversion has finished"""
+        self.queue.join()
+    
+    def cancel(self) -> int:
+        """Drop conversions that have not started yet, returning how many"""
+        cancelled = 0
+        while True:
+            try:
+                _, _, _, on_done = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                if on_done:
+                    on_done(False)
+            finally:
+                self.queue.task_done()
+            cancelled += 1
+        return cancelled
+
+
+class PostProcessor:
+    """Background stage for thumbnails, .info.json sidecars and catalog rows
+    
+    Download workers hand over each finished video and move straight on to
+    the next one; a few threads here do the follow-up work. submit() only
+    blocks once the queue is full.
+    """
+    
+    def __init__(self, process, workers: int = 2, max_pending: Optional[int] = None, log=print):
+        self.process = process
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=max_pending or workers * 32)
+        self.log = log
+        self.threads = []
+        self.lock = threading.Lock()
+    
+    @property
+    def pending(self) -> int:
+        """Queued plus in-progress items"""
+        return self.queue.unfinished_tasks
+    
+    def start(self):
+        """Start the worker threads on first use"""
+        with self.lock:
+            while len(self.threads) < self.workers:
+                thread = threading.Thread(target=self.worker, daemon=True)
+                thread.start()
+                self.threads.append(thread)
+    
+    def worker(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.process(*item)
+            except Exception as e:
+                self.log(f"✗ Post-processing error: {str(e)}")
+            finally:
+                self.queue.task_done()
+    
+    def submit(self, *item):
+        """Queue one item for processing"""
+        self.start()
+        self.queue.put(item)
+    
+    def drain(self):
+        """Block until every queued item has been processed"""
+        self.queue.join()
+    
+    def cancel(self) -> int:
+        """Drop items that have not started yet, returning how many"""
+        cancelled = 0
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+            self.queue.task_done()
+            cancelled += 1
+        return cancelled
+
+
+class TikstalkEngine:
+    """Download and monitor engine without any GUI dependency
+    
+    Front ends set the plain settings attributes below and override the
+    log_message / update_status / update_count / on_download_finished hooks
+    to surface progress however they like.
+    """
+    
+    def __init__(self, config_file: str = "tikstalk_simple_config.json",
+                 index_file: str = "tikstalk_downloads.db", log_file: str = "tikstalk.log"):
+        # Full log, streamed to a rotating file on disk. One logger per file,
+        # so engines writing different logs in one process each get their own
+        self.log_file = log_file
+        self.file_logger = logging.getLogger(f"tikstalk.{os.path.abspath(log_file)}")
+        self.file_logger.setLevel(logging.INFO)
+        self.file_logger.propagate = False
+        if not self.file_logger.handlers:
+            handler = RotatingFileHandler(log_file, maxBytes=5 * 1024 * 1024, backupCount=3,
+                                          encoding="utf-8", delay=True)
+            handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+            self.file_logger.addHandler(handler)
+        
+        # Configuration
+        self.username = "mrbeast"
+        # Set default download folder to Downloads folder next to the Python script
+        script_dir = Path(__file__).parent
+        self.download_folder = str(script_dir / "Downloads")
+        self.config_file = config_file
+        self.save_settings = True  # False writes back learned state only, keeping the saved settings
+        self.index_file = index_file
+        self.downloaded_videos = DownloadIndex(self.index_file)
+        self.journal = DownloadJournal(self.index_file)
+        self.content_store = ContentStore(self.index_file)
+        self.manifest = OutputManifest(self.index_file)
+        self.catalog = MetadataCatalog(self.index_file)
+        self.job_queue = JobQueue(self.index_file)
+        self.thumbnails = ThumbnailStore(self.index_file)
+        self.checkpoints = ListingCheckpoints(self.index_file)
+        self.postprocess_journal = PostprocessJournal(self.index_file)
+        self.dedup_content = True
+        self.dedup_bytes_saved = 0
+        self.closing = False
+        
+        # Download settings
+        self.quality = "Best MP4"
+        self.conversion = "No Conversion"
+        self.limit = 50
+        self.save_metadata = True
+        self.catalog_metadata = True
+        self.save_thumbnails = True
+        self.thumbnail_mode = "compact"  # "compact" for the shared cache, "files" for images next to videos
+        self.thumbnail_width = 320
+        self.thumbnail_max_kb = 24
+        self.thumbnail_cache_mb = 64
+        
+        # Monitoring configuration
+        self.is_monitoring = False
+        self.check_interval = 10  # minutes
+        self.bypass_ssl = True
+        self.monitor_thread = None
+        self.scheduler = None
+        self.monitored_accounts = []  # extra "username [minutes]" lines
+        self.max_concurrent_checks = 2
+        
+        # Incremental listing: fetch the feed newest-first in small pages and
+        # stop at a run of already seen videos (longer than TikTok's 3 pins)
+        self.incremental = True
+        self.incremental_page_size = 10
+        self.known_run_limit = 5
+        self.high_water_marks = {}  # username -> highest fully downloaded video ID
+        
+        # Full listings stream into the download pool and checkpoint as they go
+        self.listing_idle_timeout = 120  # seconds without a new entry before yt-dlp is stopped
+        self.checkpoint_overlap = 50  # entries re-read on resume, in case older videos were deleted
+        self.active_listings = set()
+        self.listing_pauses = set()
+        
+        # Concurrency configuration
+        self.max_workers = 3
+        self.queue_workers = 2  # account jobs run at once, each with its own download pool
+        self.queue_threads = []
+        self.requests_per_second = 1.0  # per host, shared by listing and downloads
+        
+        # Batch mode: videos per yt-dlp invocation (0 or 1 for one process per video)
+        self.batch_size = 0
+        self.batch_attempts = 2  # invocations per chunk, counting retries of failed videos
+        self.concurrent_fragments = 4
+        
+        # Retention limits; 0 turns a limit off
+        self.retention_max_total_gb = 0
+        self.retention_max_user_gb = 0
+        self.retention_max_age_days = 0
+        self.retention_keep_last = 0
+        self.retention_order = "oldest"  # or "lru"
+        self.min_free_gb = 1.0
+        self.retention_interval = 10  # minutes between background passes
+        self.retention_indexed = False  # files from before the manifest have been indexed
+        self.retention_lock = threading.Lock()
+        self.retention_stop = threading.Event()
+        self.retention_thread = None
+        self.evicted_count = 0
+        self.evicted_bytes = 0
+        self.state_lock = threading.RLock()
+        self.host_lock = threading.Lock()
+        self.rate_limiters = {}  # host -> RateLimiter
+        
+        # yt-dlp engine backends
+        self.backends = {
+            SubprocessBackend.name: SubprocessBackend(),
+            InProcessBackend.name: InProcessBackend()
+        }
+        self.backend_name = SubprocessBackend.name
+        
+        # Video format options (simplified)
+        self.video_formats = {
+            "Best Quality": "best",
+            "Best MP4": "best[ext=mp4]/best",
+            "720p MP4": "best[height<=720][ext=mp4]/best[ext=mp4]",
+            "480p MP4": "best[height<=480][ext=mp4]/best[ext=mp4]",
+            "Audio Only": "bestaudio"
+        }
+        
+        # FFmpeg conversion options (simplified)
+        self.conversion_options = {
+            "No Conversion": None,
+            "Convert to MP4": {
+                "format": "mp4",
+                "codec": "libx264",
+                "audio_codec": "aac"
+            },
+            "Compress Video": {
+                "format": "mp4",
+                "codec": "libx264",
+                "audio_codec": "aac",
+                "crf": "28"
+            },
+            "Extract Audio (MP3)": {
+                "format": "mp3",
+                "codec": "libmp3lame"
+            }
+        }
+        
+        # Conversion stage, running alongside the download workers
+        self.conversion_pipeline = ConversionPipeline(self.run_conversion, log=self.log_message)
+        
+        # Thumbnails, sidecars and catalog rows, written off the download path
+        self.postprocessor = PostProcessor(self.postprocess, log=self.log_message)
+        self.ffmpeg_processes = set()
+        self.ffmpeg_lock = threading.Lock()
+        
+        # Codec each encoder produces, used to spot conversions that need no re-encode
+        self.encoder_codecs = {"libx264": "h264", "libmp3lame": "mp3"}
+        self.mp4_audio_codecs = {"aac", "mp3", None}
+        self.transcodes_avoided = 0
+        
+        # Live transfer progress across every running batch
+        self.transfer_lock = threading.Lock()
+        self.transfer_total = 0  # videos queued in running batches
+        self.transfer_done = 0  # of those, finished (successfully or not)
+        self.transfer_bytes = 0  # bytes of finished downloads
+        self.active_transfers = {}  # video ID -> latest progress event
+        
+        # Metrics, published only when an endpoint port or snapshot file is configured
+        self.metrics = Metrics()
+        self.metrics_port = 0
+        self.metrics_file = ""
+        self.metrics_interval = 15
+        self.metrics_exporter = None
+        
+        # Dependency probe results: tool -> {'key': [path, mtime, size], 'version': ...}
+        self.tool_cache = {}
+        self.metrics.gauge('tikstalk_conversion_queue_depth', lambda: self.conversion_pipeline.pending)
+        self.metrics.gauge('tikstalk_postprocess_queue_depth', lambda: self.postprocessor.pending)
+        self.metrics.gauge('tikstalk_thumbnail_cache_bytes', lambda: self.thumbnails.total_size())
+        self.metrics.gauge('tikstalk_transfers_active', lambda: len(self.active_transfers))
+        self.metrics.gauge('tikstalk_transfers_queued', lambda: self.transfer_total - self.transfer_done)
+        self.metrics.gauge('tikstalk_monitor_accounts_scheduled',
+                           lambda: len(self.scheduler.queue) if self.scheduler else 0)
+        self.metrics.gauge('tikstalk_monitor_checks_in_flight',
+                           lambda: self.scheduler.in_flight if self.scheduler else 0)
+        self.metrics.gauge('tikstalk_indexed_videos', lambda: len(self.downloaded_videos))
+        self.metrics.gauge('tikstalk_transcodes_avoided', lambda: self.transcodes_avoided)
+        self.metrics.gauge('tikstalk_dedup_bytes_saved', lambda: self.dedup_bytes_saved)
+        self.metrics.gauge('tikstalk_jobs_queued', lambda: self.job_queue.counts().get('queued', 0))
+        self.metrics.gauge('tikstalk_jobs_running', lambda: self.job_queue.counts().get('running', 0))
+        self.metrics.gauge('tikstalk_stored_bytes', lambda: self.manifest.total_size())
+        self.metrics.gauge('tikstalk_free_bytes', self.free_bytes)
+        
+        # Create download folder
+        Path(self.download_folder).mkdir(parents=True, exist_ok=True)
+        
+        # Load configuration
+        self.load_config()
+    
+    def log_message(self, message):
+        """Write message to the log file and show it with a timestamp"""
+        self.file_logger.info(message)
+        timestamp = datetime.now().strftime("%H:%M:%S")
+        self.show_log_line(f"[{timestamp}] {message}\n")
+    
+    def show_log_line(self, log_entry):
+        """Display one timestamped log line (stdout unless a front end overrides it)"""
+        print(log_entry, end="", flush=True)
+    
+    def update_status(self, status):
+        """Report current status (no-op unless a front end overrides it)"""
+    
+    def update_count(self):
+        """Report downloaded count (no-op unless a front end overrides it)"""
+    
+    def on_download_finished(self):
+        """Called after every download_videos run, monitored or not"""
+    
+    def reset_downloads(self):
+        """Reset downloaded videos list"""
+        self.downloaded_videos.clear()
+        with self.state_lock:
+            self.high_water_marks.clear()
+        self.update_count()
+        self.save_config()
+        self.log_message("Downloaded videos list cleared")
+    
+    def probe_tool(self, name: str, version_args: List[str]) -> Optional[str]:
+        """First line of a tool's version output, or None if it isn't installed
+        
+        Results are cached by resolved path, mtime and size, so an unchanged
+        binary is never started again just to ask for its version.
+        """
+        path = shutil.which(name)
+        if path is None:
+            return None
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        key = [path, info.st_mtime, info.st_size]
+        with self.state_lock:
+            cached = self.tool_cache.get(name)
+        if cached and cached.get('key') == key:
+            return cached['version']
+        
+        try:
+            result = subprocess.run([path] + version_args, capture_output=True, text=True, timeout=60)
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        version = (result.stdout.splitlines() or [""])[0].strip()
+        with self.state_lock:
+            self.tool_cache[name] = {'key': key, 'version': version}
+        self.save_config()
+        return version
+    
+    def check_dependencies(self) -> Dict[str, bool]:
+        """Check if required tools are installed"""
+        found = {'yt-dlp': False, 'ffmpeg': False}
+        
+        # Check yt-dlp
+        version = self.probe_tool("yt-dlp", ["--version"])
+        if version is not None:
+            self.log_message(f"yt-dlp found: {version}")
+            found['yt-dlp'] = True
+        else:
+            self.log_message("yt-dlp not found. Installing...")
+            found['yt-dlp'] = self.install_ytdlp()
+        
+        # Check FFmpeg
+        version = self.probe_tool("ffmpeg", ["-version"])
+        if version is not None:
+            self.log_message(f"FFmpeg found: {version}")
+            found['ffmpeg'] = True
+        else:
+            self.log_message("FFmpeg not found. Video conversion disabled.")
+        
+        return found
+    
+    def install_ytdlp(self) -> bool:
+        """Install yt-dlp using pip3"""
+        try:
+            self.log_message("Installing yt-dlp...")
+            result = subprocess.run(["pip3", "install", "yt-dlp"], capture_output=True, text=True)
+            if result.returncode == 0:
+                self.log_message("yt-dlp installed successfully!")
+                return True
+            else:
+                self.log_message(f"Failed to install yt-dlp: {result.stderr}")
+        except Exception as e:
+            self.log_message(f"Error installing yt-dlp: {str(e)}")
+        return False
+    
+    def get_video_hash(self, video_id, title):
+        """Generate unique hash for video to prevent duplicates"""
+        unique_string = f"{video_id}_{title}"
+        return hashlib.md5(unique_string.encode()).hexdigest()
+    
+    def get_backend(self):
+        """Return the selected yt-dlp backend, falling back to subprocess"""
+        backend = self.backends.get(self.backend_name)
+        if backend is None or not backend.is_available():
+            self.log_message(f"{self.backend_name} engine unavailable, using {SubprocessBackend.name}")
+            backend = self.backends[SubprocessBackend.name]
+        return backend
+    
+    def get_rate_limiter(self, url: str = "https://www.tiktok.com") -> RateLimiter:
+        """Return the shared rate limiter for the URL's host"""
+        host = urlparse(url).netloc
+        with self.host_lock:
+            limiter = self.rate_limiters.get(host)
+            if limiter is None:
+                limiter = self.rate_limiters[host] = RateLimiter(self.requests_per_second)
+            return limiter
+    
+    def rate_limited_call(self, url: str, func, *args, attempts: int = 3, is_throttled=None, **kwargs):
+        """Call func through the host's rate limiter, backing off and retrying when throttled"""
+        limiter = self.get_rate_limiter(url)
+        for attempt in range(1, attempts + 1):
+            limiter.acquire()
+            try:
+                result = func(*args, **kwargs)
+                throttled = is_throttled is not None and is_throttled(result)
+            except ThrottledError:
+                if attempt == attempts:
+                    limiter.on_throttled()
+                    raise
+                throttled = True
+            
+            if not throttled:
+                limiter.on_success()
+                return result
+            self.metrics.inc('tikstalk_throttled_total', host=urlparse(url).netloc)
+            delay = limiter.on_throttled()
+            if attempt == attempts:
+                return result
+            self.log_message(f"Throttled by {urlparse(url).netloc}, backing off {delay:.0f}s")
+    
+    def rate_limiter_status(self) -> str:
+        """Describe the TikTok rate limiter for status displays"""
+        return self.get_rate_limiter().describe()
+    
+    def probe_codecs(self, input_path: str) -> Optional[Dict]:
+        """Return the first codec of each stream type via ffprobe, or None if probing fails"""
+        try:
+            result = subprocess.run(
+                ["ffprobe", "-v", "error", "-show_entries", "stream=codec_type,codec_name", "-of", "json", input_path],
+                capture_output=True, text=True, timeout=30
+            )
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        if result.returncode != 0:
+            return None
+        
+        codecs = {}
+        for stream in json.loads(result.stdout).get('streams', []):
+            codecs.setdefault(stream.get('codec_type'), stream.get('codec_name'))
+        return codecs
+    
+    def transcode_plan(self, input_path: str, conversion_options: Dict) -> Dict[str, bool]:
+        """Which streams ('video', 'audio') have to be re-encoded; the others are copied as they are"""
+        codecs = self.probe_codecs(input_path)
+        if codecs is None:
+            return {'video': conversion_options["format"] != "mp3", 'audio': True}
+        
+        target_codec = self.encoder_codecs.get(conversion_options.get("codec"))
+        if conversion_options["format"] == "mp3":
+            return {'video': False, 'audio': codecs.get("audio") != target_codec}
+        # Compression always re-encodes the video
+        return {'video': bool(conversion_options.get("crf")) or codecs.get("video") != target_codec,
+                'audio': codecs.get("audio") not in self.mp4_audio_codecs}
+    
+    def count_avoided_transcode(self):
+        """Count a conversion that needed no re-encode"""
+        with self.state_lock:
+            self.transcodes_avoided += 1
+        self.update_count()
+    
+    def conversion_temp_path(self, output_path: Optional[str]) -> Optional[str]:
+        """Temporary file used when a conversion would overwrite its own input"""
+        if not output_path:
+            return None
+        output = Path(output_path)
+        return str(output.with_name(f"{output.stem}.converting{output.suffix}"))
+    
+    def convert_video_with_ffmpeg(self, input_path: str, output_path: str, conversion_options: Dict):
+        """Convert video using FFmpeg, remuxing instead of re-encoding where possible"""
+        try:
+            plan = self.transcode_plan(input_path, conversion_options)
+            transcode = plan['video'] or plan['audio']
+            if not transcode and input_path == output_path:
+                self.log_message(f"✓ Already {conversion_options['format'].upper()}: {Path(output_path).name}")
+                self.count_avoided_transcode()
+                return True
+            
+            # FFmpeg can't write over its own input, so go through a temporary file
+            final_path = output_path
+            if input_path == output_path:
+                output_path = self.conversion_temp_path(output_path)
+            
+            cmd = ["ffmpeg", "-i", input_path, "-y"]  # -y to overwrite
+            
+            # Re-encode only the streams that need it and stream-copy the rest
+            if conversion_options["format"] == "mp3":
+                cmd.extend(["-vn", "-acodec", conversion_options["codec"] if plan['audio'] else "copy"])
+            else:
+                if plan['video']:
+                    cmd.extend(["-c:v", conversion_options["codec"]])
+                    if conversion_options.get("crf"):
+                        cmd.extend(["-crf", conversion_options["crf"]])
+                else:
+                    cmd.extend(["-c:v", "copy"])
+                cmd.extend(["-c:a", conversion_options["audio_codec"] if plan['audio'] else "copy"])
+            
+            cmd.append(output_path)
+            
+            # Track the process so pending work can be cancelled
+            process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+            with self.ffmpeg_lock:
+                self.ffmpeg_processes.add(process)
+            try:
+                _, stderr = process.communicate()
+            finally:
+                with self.ffmpeg_lock:
+                    self.ffmpeg_processes.discard(process)
+            
+            if process.returncode == 0:
+                if output_path != final_path:
+                    os.replace(output_path, final_path)
+                elif input_path != output_path:
+                    # Remove original file if conversion successful
+                    os.remove(input_path)
+                if transcode and not plan['video'] and conversion_options["format"] != "mp3":
+                    self.log_message(f"✓ Converted audio, copied video: {Path(final_path).name}")
+                elif transcode:
+                    self.log_message(f"✓ Converted: {Path(final_path).name}")
+                else:
+                    self.log_message(f"✓ Remuxed without re-encoding: {Path(final_path).name}")
+                    self.count_avoided_transcode()
+                return True
+            else:
+                self.log_message(f"✗ Conversion failed: {stderr[:100]}")
+                # Don't leave a half-written output behind
+                if input_path != output_path and os.path.exists(output_path):
+                    os.remove(output_path)
+                return False
+                
+        except Exception as e:
+            self.log_message(f"✗ Conversion error: {str(e)}")
+            return False
+    
+    def run_conversion(self, input_path: str, output_path: str, conversion_options: Dict) -> bool:
+        """Conversion pipeline entry point: convert and record the outcome"""
+        with self.metrics.timer('tikstalk_conversion_seconds'):
+            result = self.convert_video_with_ffmpeg(input_path, output_path, conversion_options)
+        self.metrics.inc('tikstalk_conversions_total', result='succeeded' if result else 'failed')
+        return result
+    
+    def cancel_conversions(self):
+        """Cancel queued conversions and stop any FFmpeg process still running"""
+        cancelled = self.conversion_pipeline.cancel()
+        with self.ffmpeg_lock:
+            running = list(self.ffmpeg_processes)
+        for process in running:
+            process.terminate()
+        if cancelled or running:
+            self.log_message(f"Cancelled {cancelled + len(running)} pending conversions")
+    
+    def is_known_video(self, username: str, video_id: str, video_hash: str) -> bool:
+        """Check if a video was already downloaded"""
+        return self.downloaded_videos.contains(video_hash, username, video_id)
+    
+    def below_high_water_mark(self, username: str, video_id: str) -> bool:
+        """Check if a video is at or below the ID the user's feed was last fully listed to"""
+        with self.state_lock:
+            high_water = self.high_water_marks.get(username)
+        return high_water is not None and video_id.isdigit() and int(video_id) <= high_water
+    
+    def list_new_videos(self, username: str, url: str, limit: int, incremental: bool = False):
+        """List new videos newest-first, returning (videos, highest listed ID, covered)
+        
+        In incremental mode the feed is read a page at a time and listing
+        stops at the first run of known videos or of videos at or below the
+        user's high-water mark, so a quiet check costs a single page fetch
+        instead of `limit` entries. Runs rather than single entries, because
+        old pinned videos sit at the top of the feed. A limit of 0 lists
+        until the end of the feed. `covered` is True when the listing reached
+        the end of the feed or the previous high-water mark, i.e. nothing
+        older was left unlisted.
+        """
+        backend = self.get_backend()
+        options = {'ssl_bypass': self.bypass_ssl}
+        page_size = self.incremental_page_size if incremental or not limit else limit
+        
+        videos = []
+        newest_id = None
+        known_run = 0
+        below_run = 0
+        start = 1
+        while not limit or start <= limit:
+            end = start + page_size - 1 if not limit else min(start + page_size - 1, limit)
+            # An empty first page is usually TikTok throttling us rather than an empty profile
+            try:
+                with self.metrics.timer('tikstalk_listing_seconds'):
+                    entries = self.rate_limited_call(url, backend.list_videos, url, end, options, start=start,
+                                                     is_throttled=lambda result: start == 1 and not result)
+            except Exception:
+                self.metrics.inc('tikstalk_listing_pages_total', result='failed')
+                raise
+            self.metrics.inc('tikstalk_listing_pages_total', result='succeeded')
+            
+            for video_id, title in entries:
+                if video_id.isdigit():
+                    newest_id = max(newest_id or 0, int(video_id))
+                
+                video_hash = self.get_video_hash(video_id, title)
+                if not self.is_known_video(username, video_id, video_hash):
+                    videos.append({'id': video_id, 'title': title, 'hash': video_hash})
+                    known_run = 0
+                else:
+                    self.metrics.inc('tikstalk_videos_total', result='skipped')
+                    known_run += 1
+                if not incremental:
+                    continue
+                # Everything older than the mark was listed through by an earlier run
+                below_run = below_run + 1 if self.below_high_water_mark(username, video_id) else 0
+                if below_run >= self.known_run_limit:
+                    return videos, newest_id, True
+                if known_run >= self.known_run_limit:
+                    return videos, newest_id, False
+            
+            # A short page means we reached the end of the feed
+            if len(entries) < end - start + 1:
+                return videos, newest_id, True
+            start = end + 1
+        
+        return videos, newest_id, False
+    
+    def download_videos(self, username: str, incremental: bool = False):
+        """Download videos from TikTok user"""
+        try:
+            # Clean username
+            clean_username = username.replace('@', '')
+            user_folder = Path(self.download_folder) / clean_username
+            user_folder.mkdir(parents=True, exist_ok=True)
+            
+            # Get video list first
+            self.update_status("Getting video list...")
+            self.log_message(f"Getting videos for @{clean_username}")
+            
+            url = f"https://www.tiktok.com/@{clean_username}"
+            limit = int(self.limit)
+            
+            # Full listings stream straight into the download pool
+            if not incremental:
+                self.stream_download(clean_username, url, user_folder, limit)
+                return
+            
+            # Get video info, skipping already downloaded videos
+            try:
+                videos, newest_id, covered = self.list_new_videos(clean_username, url, limit, incremental)
+            except BackendError as e:
+                self.log_message(f"✗ Failed to get video list: {e}")
+                return
+            
+            if not videos:
+                if covered and self.update_high_water_mark(clean_username, newest_id):
+                    self.save_config()
+                self.log_message("No new videos to download")
+                self.update_status("No new videos found")
+                return
+            
+            self.log_message(f"Found {len(videos)} new videos to download")
+            successful = self.download_batch(clean_username, user_folder, videos)
+            
+            # Only advance the high-water mark once nothing below it is missing
+            if covered and successful == len(videos):
+                self.update_high_water_mark(clean_username, newest_id)
+            self.save_config()
+            
+        except subprocess.TimeoutExpired:
+            self.log_message("✗ Timeout getting video list")
+        except Exception as e:
+            self.log_message(f"✗ Error: {str(e)}")
+        finally:
+            self.on_download_finished()
+    
+    def stream_download(self, username: str, url: str, user_folder: Path, limit: int):
+        """List an account and download its new videos while the listing is still running
+        
+        Continues from the account's checkpoint if an earlier listing was
+        paused or interrupted, and clears it once the end of the feed (or
+        `limit`) is reached.
+        """
+        listing = {'position': 0, 'newest_id': None, 'failed': 0, 'complete': False, 'checkpoint': True}
+        saved = self.checkpoints.get(username)
+        if saved and limit and saved['position'] >= limit:
+            # This run ends before the checkpoint; leave it for a longer listing
+            saved = None
+            listing['checkpoint'] = False
+        if saved:
+            listing.update(saved)
+            listing['start'] = max(0, saved['position'] - self.checkpoint_overlap)
+            self.log_message(f"Resuming listing of @{username} from video {listing['start'] + 1}")
+        
+        with self.state_lock:
+            self.listing_pauses.discard(username)
+            self.active_listings.add(username)
+        try:
+            successful, queued = self.download_stream(
+                username, user_folder, self.stream_new_videos(username, url, limit, listing))
+        finally:
+            with self.state_lock:
+                self.active_listings.discard(username)
+                self.listing_pauses.discard(username)
+        listing['failed'] += queued - successful
+        
+        if listing['complete']:
+            if listing['checkpoint']:
+                self.checkpoints.remove(username)
+            # Only advance the high-water mark once the whole feed was listed and nothing is missing
+            if not listing['failed'] and (not limit or listing['position'] < limit):
+                self.update_high_water_mark(username, listing['newest_id'])
+            if not queued:
+                self.log_message("No new videos to download")
+                self.update_status("No new videos found")
+        elif listing['checkpoint'] and (listing['position'] or saved):
+            self.checkpoints.set(username, listing['position'], listing['newest_id'], listing['failed'])
+            self.log_message(f"Listing of @{username} stopped at video {listing['position']}; "
+                             f"download the account again to continue")
+        self.save_config()
+    
+    def stream_new_videos(self, username: str, url: str, limit: int, listing: Dict):
+        """Yield new videos in small lists as the listing streams in
+        
+        When the consumer asks for the next list, the previous one has been
+        journaled, so the feed position is checkpointed at that point. Runs
+        of known videos are checkpointed every 100 entries. `listing` is
+        updated in place and marked complete once the feed runs out; a
+        resumed listing starts a little before its checkpoint (`start`).
+        """
+        backend = self.get_backend()
+        options = {'ssl_bypass': self.bypass_ssl}
+        limiter = self.get_rate_limiter(url)
+        group = int(self.batch_size) if self.use_batch_mode() else max(1, int(self.max_workers))
+        started = time.perf_counter()
+        
+        for attempt in range(1, 4):
+            limiter.acquire()
+            position = listing.pop('start', listing['position'])
+            pending = []
+            try:
+                entries = backend.iter_videos(url, options, start=position + 1, end=limit or None,
+                                              timeout=self.listing_idle_timeout)
+                try:
+                    for video_id, title in entries:
+                        if started is not None:
+                            self.metrics.observe('tikstalk_listing_first_entry_seconds',
+                                                 time.perf_counter() - started)
+                            started = None
+                        position += 1
+                        self.metrics.inc('tikstalk_listing_entries_total')
+                        if video_id.isdigit():
+                            listing['newest_id'] = max(listing['newest_id'] or 0, int(video_id))
+                        
+                        video_hash = self.get_video_hash(video_id, title)
+                        if self.is_known_video(username, video_id, video_hash):
+                            self.metrics.inc('tikstalk_videos_total', result='skipped')
+                        else:
+                            pending.append({'id': video_id, 'title': title, 'hash': video_hash})
+                        
+                        if len(pending) >= group or (not pending and position - listing['position'] >= 100):
+                            if pending:
+                                yield pending
+                                pending = []
+                            listing['position'] = max(listing['position'], position)
+                            if listing['checkpoint']:
+                                self.checkpoints.set(username, listing['position'], listing['newest_id'],
+                                                     listing['failed'])
+                        
+                        if username in self.listing_pauses or self.closing:
+                            self.log_message(f"Paused listing of @{username} at video {listing['position']}")
+                            return
+                finally:
+                    entries.close()
+            except ThrottledError as e:
+                delay = limiter.on_throttled()
+                self.metrics.inc('tikstalk_throttled_total', host=urlparse(url).netloc)
+                if attempt == 3:
+                    self.log_message(f"✗ Failed to get video list: {e}")
+                    return
+                self.log_message(f"Throttled by {urlparse(url).netloc}, backing off {delay:.0f}s")
+                continue
+            except (BackendError, subprocess.TimeoutExpired) as e:
+                self.log_message(f"✗ Failed to get video list: {str(e)[:200]}")
+                self.metrics.inc('tikstalk_listing_pages_total', result='failed')
+                return
+            
+            # An empty first listing is usually TikTok throttling us rather than an empty profile
+            if position == 0 and attempt < 3:
+                delay = limiter.on_throttled()
+                self.metrics.inc('tikstalk_throttled_total', host=urlparse(url).netloc)
+                self.log_message(f"Throttled by {urlparse(url).netloc}, backing off {delay:.0f}s")
+                continue
+            
+            limiter.on_success()
+            self.metrics.inc('tikstalk_listing_pages_total', result='succeeded')
+            if pending:
+                yield pending
+            listing['position'] = max(listing['position'], position)
+            listing['complete'] = True
+            return
+    
+    def pause_listing(self, username: Optional[str] = None):
+        """Stop a running full listing (or all of them) at the next entry, keeping its checkpoint"""
+        with self.state_lock:
+            self.listing_pauses.update([username] if username else self.active_listings)
+    
+    def download_batch(self, username: str, user_folder: Path, videos: List[Dict]) -> int:
+        """Download videos through the worker pool, returning how many succeeded"""
+        successful, _ = self.download_stream(username, user_folder, [videos])
+        return successful
+    
+    def download_stream(self, username: str, user_folder: Path, batches) -> Tuple[int, int]:
+        """Download lists of videos through the worker pool as they arrive
+        
+        `batches` may be a generator still listing the account. Each list is
+        journaled before any of it starts, and only a couple of rounds of
+        work are kept waiting in the pool, so a huge feed is never all held
+        in memory. Returns (succeeded, queued).
+        """
+        self.max_workers = max(1, int(self.max_workers))
+        self.update_status(f"Downloading ({self.max_workers} at a time)...")
+        successful = 0
+        completed = 0
+        queued = 0
+        batch_bytes = 0
+        batch_start = time.monotonic()
+        chunk_size = int(self.batch_size) if self.use_batch_mode() else 0
+        in_flight = {}
+        
+        def collect(done):
+            nonlocal successful, completed, batch_bytes
+            for future in done:
+                result = future.result()
+                for video in in_flight.pop(future):
+                    completed += 1
+                    batch_bytes += self.finish_transfer(video['id'])
+                    self.update_status(f"Downloaded {completed}/{queued}: {video['title'][:30]}...")
+                    
+                    if result is True or (isinstance(result, set) and video['id'] in result):
+                        successful += 1
+                        self.update_count()
+        
+        # Pacing between requests is handled per host by rate_limited_call / download_chunk
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for videos in batches:
+                self.journal.enqueue(username, videos, self.conversion)
+                self.begin_transfers(len(videos))
+                queued += len(videos)
+                if chunk_size:
+                    for i in range(0, len(videos), chunk_size):
+                        chunk = videos[i:i + chunk_size]
+                        in_flight[executor.submit(self.download_chunk, username, chunk, user_folder)] = chunk
+                else:
+                    for video in videos:
+                        future = executor.submit(self.download_single_video, username, video, user_folder)
+                        in_flight[future] = [video]
+                
+                # Hold the listing back while the pool has plenty queued
+                while len(in_flight) >= self.max_workers * 2:
+                    done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+        
+        if not queued:
+            return 0, 0
+        elapsed = max(time.monotonic() - batch_start, 0.001)
+        self.log_message(f"Download complete: {successful}/{queued} videos downloaded "
+                         f"({format_bytes(batch_bytes)} at {format_bytes(batch_bytes / elapsed)}/s)")
+        self.update_status(f"Complete: {successful}/{queued} downloaded")
+        
+        # Quotas are checked right away rather than waiting for the next background pass
+        if successful and self.retention_enabled():
+            try:
+                self.enforce_retention()
+            except Exception as e:
+                self.log_message(f"✗ Retention error: {str(e)}")
+        return successful, queued
+    
+    def use_batch_mode(self) -> bool:
+        """Batch mode needs a chunk size above one and a backend that takes batch files"""
+        return int(self.batch_size) > 1 and hasattr(self.get_backend(), 'download_many')
+    
+    def begin_transfers(self, count: int):
+        """Add a batch of videos to the live progress totals"""
+        with self.transfer_lock:
+            if self.transfer_done >= self.transfer_total and not self.active_transfers:
+                self.transfer_total = self.transfer_done = self.transfer_bytes = 0
+            self.transfer_total += count
+    
+    def record_progress(self, video_id: str, event: Dict):
+        """Store the latest progress event for an active download"""
+        with self.transfer_lock:
+            self.active_transfers[video_id] = event
+    
+    def finish_transfer(self, video_id: str) -> float:
+        """Mark a download finished, returning the bytes it transferred"""
+        with self.transfer_lock:
+            event = self.active_transfers.pop(video_id, None)
+            size = (event or {}).get('downloaded_bytes') or 0
+            self.transfer_done += 1
+            self.transfer_bytes += size
+        self.metrics.inc('tikstalk_downloaded_bytes_total', int(size))
+        return size
+    
+    def progress_snapshot(self) -> Dict:
+        """Aggregate progress and throughput of all running downloads"""
+        with self.transfer_lock:
+            events = list(self.active_transfers.values())
+            snapshot = {
+                'total': self.transfer_total,
+                'done': self.transfer_done,
+                'active': len(events),
+                'bytes': self.transfer_bytes + sum(e['downloaded_bytes'] or 0 for e in events),
+                'speed': sum(e['speed'] or 0 for e in events),
+                'eta': max((e['eta'] for e in events if e['eta'] is not None), default=None)
+            }
+        
+        partial = 0.0
+        for event in events:
+            if event['downloaded_bytes'] is not None and event['total_bytes']:
+                partial += min(1.0, event['downloaded_bytes'] / event['total_bytes'])
+            elif event['fragment_index'] is not None and event['fragment_count']:
+                partial += min(1.0, event['fragment_index'] / event['fragment_count'])
+        snapshot['fraction'] = (snapshot['done'] + partial) / snapshot['total'] if snapshot['total'] else 0.0
+        return snapshot
+    
+    def update_high_water_mark(self, username: str, video_id: Optional[int]):
+        """Raise the user's high-water mark to the given video ID, returning True if it moved"""
+        with self.state_lock:
+            if video_id is None or video_id <= self.high_water_marks.get(username, 0):
+                return False
+            self.high_water_marks[username] = video_id
+            return True
+    
+    def download_options(self) -> Dict:
+        """Backend options for the current settings"""
+        return {
+            'format': self.video_formats.get(self.quality, "best"),
+            'ssl_bypass': self.bypass_ssl,
+            'info': 'full' if self.save_metadata else
+                    'fields' if self.catalog_metadata or self.save_thumbnails else None
+        }
+    
+    def download_single_video(self, username: str, video_info: Dict, user_folder: Path) -> bool:
+        """Download a single video"""
+        started = time.perf_counter()
+        self.metrics.inc('tikstalk_videos_total', result='attempted')
+        try:
+            video_id = video_info['id']
+            title = video_info['title']
+            
+            # Construct URL
+            video_url = f"https://www.tiktok.com/@{username}/video/{video_id}"
+            
+            # Build filename
+            safe_title = "".join(c for c in title if c.isalnum() or c in (' ', '-', '_')).rstrip()[:50]
+            filename_template = f"{username}_{video_id}_{safe_title}.%(ext)s"
+            
+            if not self.ensure_free_space():
+                self.fail_download(username, video_info, f"✗ Skipped: {title[:40]} - less than "
+                                                         f"{self.min_free_gb} GB free")
+                return False
+            
+            # Execute download; yt-dlp picks up any .part file left by an interrupted run
+            self.journal.set_state(username, video_id, 'downloading')
+            try:
+                output_path, metadata = self.rate_limited_call(
+                    video_url, self.get_backend().download,
+                    video_url, str(user_folder / filename_template), self.download_options(),
+                    progress=lambda event: self.record_progress(video_id, event))
+            except BackendError as e:
+                self.fail_download(username, video_info, f"✗ Failed: {title[:40]} - {str(e)[:50]}")
+                return False
+            
+            self.complete_download(username, video_info, output_path, metadata)
+            return True
+                
+        except subprocess.TimeoutExpired:
+            self.fail_download(username, video_info, f"✗ Timeout: {title[:40]}")
+            return False
+        except Exception as e:
+            self.fail_download(username, video_info, f"✗ Error: {title[:40]} - {str(e)}")
+            return False
+        finally:
+            self.metrics.observe('tikstalk_download_seconds', time.perf_counter() - started)
+    
+    def download_chunk(self, username: str, videos: List[Dict], user_folder: Path) -> set:
+        """Download a chunk of videos through one yt-dlp invocation, returning the IDs that succeeded
+        
+        Videos yt-dlp reports as failed (or never finishes) are retried on
+        their own, up to batch_attempts invocations in total; the ones that
+        succeeded are never fetched twice.
+        """
+        backend = self.get_backend()
+        limiter = self.get_rate_limiter()
+        options = dict(self.download_options(), concurrent_fragments=self.concurrent_fragments)
+        # Titles come from yt-dlp here, since one output template serves the whole chunk
+        output_template = str(user_folder / f"{username}_%(id)s_%(title).50B.%(ext)s")
+        
+        pending = {video['id']: video for video in videos}
+        for video_id in pending:
+            self.journal.set_state(username, video_id, 'downloading')
+            self.metrics.inc('tikstalk_videos_total', result='attempted')
+        if not self.ensure_free_space():
+            for video in videos:
+                self.fail_download(username, video, f"✗ Skipped: {video['title'][:40]} - less than "
+                                                    f"{self.min_free_gb} GB free")
+            return set()
+        
+        def progress(event: Dict):
+            if event.get('video_id') in pending:
+                self.record_progress(event['video_id'], event)
+        
+        succeeded = set()
+        errors = {}
+        for attempt in range(1, max(1, int(self.batch_attempts)) + 1):
+            urls = [f"https://www.tiktok.com/@{username}/video/{video_id}" for video_id in pending]
+            limiter.acquire()
+            # yt-dlp paces the videos inside the chunk at the limiter's current rate
+            options['sleep_interval'] = 1 / limiter.rate
+            started = time.perf_counter()
+            try:
+                completed, errors = backend.download_many(urls, output_template, options, progress=progress,
+                                                          timeout=120 * len(urls))
+            except subprocess.TimeoutExpired:
+                completed, errors = {}, {video_id: "timed out" for video_id in pending}
+            except Exception as e:
+                completed, errors = {}, {video_id: str(e) for video_id in pending}
+            self.metrics.observe('tikstalk_batch_seconds', time.perf_counter() - started)
+            
+            for video_id, (output_path, metadata) in completed.items():
+                video = pending.pop(video_id, None)
+                if video is not None:
+                    self.complete_download(username, video, output_path, metadata)
+                    succeeded.add(video_id)
+            if not pending:
+                break
+            
+            if any(is_throttle_message(message) for message in errors.values()):
+                delay = limiter.on_throttled()
+                self.metrics.inc('tikstalk_throttled_total', host=urlparse(urls[0]).netloc)
+                if attempt < self.batch_attempts:
+                    self.log_message(f"Throttled by {urlparse(urls[0]).netloc}, backing off {delay:.0f}s")
+                    time.sleep(delay)
+            elif completed:
+                limiter.on_success()
+            if attempt < self.batch_attempts:
+                self.log_message(f"Retrying {len(pending)} failed videos from a batch of {len(videos)}")
+        
+        for video_id, video in pending.items():
+            message = errors.get(video_id) or errors.get("") or "no output from yt-dlp"
+            self.fail_download(username, video, f"✗ Failed: {video['title'][:40]} - {message[:50]}")
+        return succeeded
+    
+    def complete_download(self, username: str, video_info: Dict, output_path: Optional[str],
+                          metadata: Optional[Dict]):
+        """Record a finished download and hand it to the post-processing and conversion stages"""
+        video_id = video_info['id']
+        if output_path:
+            self.manifest.set(username, video_id, output_path)
+        if metadata:
+            self.postprocess_journal.add(username, video_id, output_path, metadata)
+            self.postprocessor.submit(username, video_id, output_path, metadata)
+        self.downloaded_videos.add(video_info['hash'], username, video_id, video_info['title'])
+        self.journal.set_state(username, video_id, 'downloaded')
+        
+        # Handle video conversion if enabled
+        self.queue_conversion(username, video_id, self.conversion)
+        
+        self.log_message(f"✓ Downloaded: {video_info['title'][:40]}")
+        self.metrics.inc('tikstalk_videos_total', result='succeeded')
+    
+    def postprocess(self, username: str, video_id: str, output_path: Optional[str], info: Dict):
+        """Write the catalog row, .info.json sidecar and thumbnail for a finished download"""
+        with self.metrics.timer('tikstalk_postprocess_seconds'):
+            if self.catalog_metadata:
+                self.catalog.add(username, pick_metadata(info))
+            if self.save_metadata and output_path:
+                with open(os.path.splitext(output_path)[0] + ".info.json", 'w', encoding='utf-8') as f:
+                    json.dump(info, f, ensure_ascii=False)
+            if self.save_thumbnails and info.get('thumbnail'):
+                self.save_thumbnail(username, video_id, output_path, info['thumbnail'])
+            self.postprocess_journal.remove(username, video_id)
+    
+    def fetch_thumbnail(self, url: str) -> Tuple[bytes, str]:
+        """Download a thumbnail, returning (data, mime type)"""
+        context = ssl._create_unverified_context() if self.bypass_ssl else None
+        request = urllib.request.Request(url, headers={'User-Agent': "Mozilla/5.0"})
+        with urllib.request.urlopen(request, timeout=30, context=context) as response:
+            return response.read(), response.headers.get_content_type()
+    
+    def compact_thumbnail(self, data: bytes, mime: str) -> Optional[Tuple[bytes, str]]:
+        """Scale a thumbnail down and re-encode it as JPEG under thumbnail_max_kb
+        
+        Quality is lowered step by step until the image fits. Without FFmpeg
+        (or for images it can't read) originals are kept only if small enough.
+        """
+        cap = float(self.thumbnail_max_kb) * 1024
+        if self.probe_tool("ffmpeg", ["-version"]) is not None:
+            width = int(self.thumbnail_width)
+            for quality in (4, 8, 16, 31):
+                try:
+                    result = subprocess.run(
+                        ["ffmpeg", "-v", "error", "-i", "pipe:0", "-frames:v", "1",
+                         "-vf", f"scale='min({width},iw)':-2", "-q:v", str(quality),
+                         "-c:v", "mjpeg", "-f", "image2pipe", "pipe:1"],
+                        input=data, capture_output=True, timeout=30
+                    )
+                except (OSError, subprocess.TimeoutExpired):
+                    break
+                if result.returncode != 0 or not result.stdout:
+                    break
+                if len(result.stdout) <= cap:
+                    return result.stdout, 'image/jpeg'
+        if len(data) <= cap:
+            return data, mime
+        return None
+    
+    def save_thumbnail(self, username: str, video_id: str, output_path: Optional[str], url: str):
+        """Fetch a thumbnail into the compact cache, or next to its video in "files" mode"""
+        try:
+            data, mime = self.fetch_thumbnail(url)
+        except (OSError, ValueError) as e:
+            self.log_message(f"✗ Thumbnail failed: {video_id} - {str(e)[:50]}")
+            self.metrics.inc('tikstalk_thumbnails_total', result='failed')
+            return
+        
+        if self.thumbnail_mode == "compact":
+            compact = self.compact_thumbnail(data, mime)
+            if compact is None:
+                self.log_message(f"✗ Thumbnail for {video_id} is over {self.thumbnail_max_kb} KB, not cached")
+                self.metrics.inc('tikstalk_thumbnails_total', result='failed')
+                return
+            self.thumbnails.put(username, video_id, *compact)
+            self.thumbnails.trim(float(self.thumbnail_cache_mb) * 1024 * 1024)
+            self.metrics.inc('tikstalk_thumbnails_total', result='cached')
+            self.metrics.inc('tikstalk_thumbnail_bytes_saved_total', max(0, len(data) - len(compact[0])))
+        elif output_path:
+            extension = THUMBNAIL_EXTENSIONS.get(mime, ".jpg")
+            with open(os.path.splitext(output_path)[0] + extension, 'wb') as f:
+                f.write(data)
+            self.metrics.inc('tikstalk_thumbnails_total', result='saved')
+    
+    def export_thumbnails(self, folder: str, username: Optional[str] = None) -> int:
+        """Write cached thumbnails out as files named username_videoid"""
+        Path(folder).mkdir(parents=True, exist_ok=True)
+        exported = 0
+        for user, video_id in self.thumbnails.keys(username):
+            cached = self.thumbnails.get(user, video_id)
+            if cached is None:
+                continue
+            data, mime = cached
+            with open(Path(folder) / f"{user}_{video_id}{THUMBNAIL_EXTENSIONS.get(mime, '.jpg')}", 'wb') as f:
+                f.write(data)
+            exported += 1
+        self.log_message(f"✓ Exported {exported} thumbnails to {folder}")
+        return exported
+    
+    def fail_download(self, username: str, video_info: Dict, message: str):
+        """Log a failed download and drop its journal entry"""
+        self.log_message(message)
+        self.journal.remove(username, video_info['id'])
+        self.metrics.inc('tikstalk_videos_total', result='failed')
+    
+    def queue_conversion(self, username: str, video_id: str, conversion_key: str):
+        """Hand a downloaded video to the conversion stage, or close its job if none is needed"""
+        conversion_opts = self.conversion_options.get(conversion_key)
+        recorded = self.manifest.get(username, video_id)
+        file_path = Path(recorded) if recorded and os.path.exists(recorded) else None
+        if file_path is None or not conversion_opts:
+            if file_path is not None and self.deduplicate_file(str(file_path)):
+                self.manifest.set(username, video_id, str(file_path))
+            self.journal.remove(username, video_id)
+            return
+        
+        output_path = file_path.with_suffix(f".{conversion_opts['format']}")
+        self.journal.set_state(username, video_id, 'converting', str(file_path), str(output_path))
+        self.conversion_pipeline.submit(
+            str(file_path), str(output_path), conversion_opts,
+            on_done=lambda result: self.finish_conversion_job(username, video_id, result, str(output_path))
+        )
+    
+    def finish_conversion_job(self, username: str, video_id: str, result: bool, output_path: str):
+        """Close a conversion job, unless it was cut short by shutdown and should be redone"""
+        if self.closing:
+            return
+        if result:
+            self.deduplicate_file(output_path)
+            self.manifest.set(username, video_id, output_path)
+        self.journal.remove(username, video_id)
+    
+    def deduplicate_file(self, path: str) -> bool:
+        """Replace a file with a hardlink if identical content is already stored, returning True if linked"""
+        if not self.dedup_content or not os.path.exists(path):
+            return False
+        try:
+            size = os.path.getsize(path)
+            digest = self.content_store.hash_file(path)
+            existing = self.content_store.find(digest)
+            
+            if existing is None or not os.path.exists(existing):
+                self.content_store.record(digest, size, path)
+                return False
+            if os.path.samefile(existing, path):
+                return False
+            
+            # Swap in the link atomically so the path is never missing. Without
+            # hardlink support the copy is kept: a symlink would dangle once
+            # the canonical file is evicted or deleted.
+            temp_path = f"{path}.dedup"
+            try:
+                os.link(existing, temp_path)
+            except OSError:
+                return False
+            os.replace(temp_path, path)
+            
+            with self.state_lock:
+                self.dedup_bytes_saved += size
+            self.metrics.inc('tikstalk_dedup_links_total')
+            self.log_message(f"♻ Duplicate of {Path(existing).name}, linked instead of stored ({format_bytes(size)} saved)")
+            return True
+        except OSError as e:
+            self.log_message(f"✗ Dedup error: {Path(path).name} - {str(e)}")
+            return False
+    
+    def retention_enabled(self) -> bool:
+        return bool(self.retention_max_total_gb or self.retention_max_user_gb or
+                    self.retention_max_age_days or self.retention_keep_last)
+    
+    def evict(self, row: Tuple, reason: str) -> Optional[int]:
+        """Delete one indexed video and its sidecars, returning the bytes it took (None if it couldn't be deleted)"""
+        username, video_id, path, size = row
+        size = size or 0
+        try:
+            info = os.stat(path)
+            if info.st_nlink > 1:
+                # Another hardlink keeps the media itself; only the sidecars are freed
+                size = max(0, size - info.st_size)
+        except OSError:
+            pass
+        for file_path in [path] + sidecar_paths(path):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                self.log_message(f"✗ Eviction error: {Path(file_path).name} - {str(e)}")
+                return None
+        self.manifest.remove(username, video_id)
+        self.thumbnails.remove(username, video_id)
+        with self.state_lock:
+            self.evicted_count += 1
+            self.evicted_bytes += size
+        self.metrics.inc('tikstalk_evictions_total', reason=reason)
+        self.metrics.inc('tikstalk_evicted_bytes_total', size, reason=reason)
+        self.log_message(f"🗑 Evicted @{username} {Path(path).name} ({format_bytes(size)}, {reason})")
+        return size
+    
+    def evict_until(self, excess: float, reason: str, username: Optional[str] = None,
+                    cutoff: Optional[float] = None) -> int:
+        """Evict oldest-first (or least recently used) until `excess` bytes are freed
+        
+        With a `cutoff`, evicts videos added before it instead. Rows whose
+        files can't be deleted are skipped, and a pass that evicts nothing
+        ends the loop, so one stuck file never stalls retention.
+        """
+        order = 'accessed_at' if self.retention_order == "lru" else 'added_at'
+        freed = 0
+        stuck = set()
+        while freed < excess:
+            limit = 50 + len(stuck)
+            if cutoff is not None:
+                rows = self.manifest.older_than(cutoff, limit)
+            else:
+                rows = self.manifest.oldest(order, username, limit)
+            evicted = 0
+            for row in rows:
+                if row[:2] in stuck:
+                    continue
+                size = self.evict(row, reason)
+                if size is None:
+                    stuck.add(row[:2])
+                    continue
+                evicted += 1
+                freed += size
+                if freed >= excess:
+                    break
+            if not evicted:
+                break
+        return freed
+    
+    def free_bytes(self) -> int:
+        try:
+            return shutil.disk_usage(self.download_folder).free
+        except OSError:
+            return -1
+    
+    def enforce_retention(self) -> int:
+        """Apply every configured limit, returning the bytes freed"""
+        gb = 1024 ** 3
+        freed = 0
+        with self.retention_lock:
+            if self.retention_max_age_days:
+                cutoff = time.time() - float(self.retention_max_age_days) * 86400
+                freed += self.evict_until(float('inf'), "max age", cutoff=cutoff)
+            
+            if self.retention_keep_last:
+                for row in self.manifest.beyond_newest(int(self.retention_keep_last)):
+                    freed += self.evict(row, "keep last") or 0
+            
+            if self.retention_max_user_gb:
+                limit = float(self.retention_max_user_gb) * gb
+                for username, size in self.manifest.user_sizes().items():
+                    if size > limit:
+                        freed += self.evict_until(size - limit, "user quota", username)
+            
+            if self.retention_max_total_gb:
+                excess = self.manifest.total_size() - float(self.retention_max_total_gb) * gb
+                if excess > 0:
+                    freed += self.evict_until(excess, "total quota")
+            
+            freed += self.reclaim_free_space()
+        return freed
+    
+    def reclaim_free_space(self) -> int:
+        """Evict when the volume is below min_free_gb; call with retention_lock held"""
+        free = self.free_bytes()
+        needed = float(self.min_free_gb) * 1024 ** 3 - free
+        if free < 0 or needed <= 0:
+            return 0
+        if needed > self.manifest.total_size():
+            # Evicting every indexed video still wouldn't reach the floor
+            return 0
+        return self.evict_until(needed, "low disk space")
+    
+    def ensure_free_space(self) -> bool:
+        """Check free space before a download, evicting first if retention allows it"""
+        if not self.min_free_gb:
+            return True
+        free = self.free_bytes()
+        if free < 0 or free >= float(self.min_free_gb) * 1024 ** 3:
+            return True
+        if self.retention_enabled():
+            with self.retention_lock:
+                self.reclaim_free_space()
+            free = self.free_bytes()
+        return free >= float(self.min_free_gb) * 1024 ** 3
+    
+    def refresh_manifest(self):
+        """Refresh sizes and access times from the indexed paths and drop rows whose files are gone
+        
+        Works a page at a time by key, so the index is never locked for long
+        and the download tree itself is never walked.
+        """
+        after = ("", "")
+        while not self.retention_stop.is_set():
+            rows = self.manifest.page(after)
+            if not rows:
+                break
+            updates = []
+            for username, video_id, path in rows:
+                try:
+                    info = os.stat(path)
+                except FileNotFoundError:
+                    self.manifest.remove(username, video_id)
+                    continue
+                except OSError:
+                    continue
+                updates.append((media_footprint(path), f"{info.st_dev}:{info.st_ino}", info.st_atime,
+                                username, video_id))
+            self.manifest.update_stats(updates)
+            after = rows[-1][:2]
+    
+    def index_existing_downloads(self):
+        """One-time walk adding files downloaded before the manifest existed"""
+        root = Path(self.download_folder)
+        added = 0
+        if root.is_dir():
+            for user_dir in os.scandir(root):
+                if not user_dir.is_dir():
+                    continue
+                prefix = f"{user_dir.name}_"
+                for entry in os.scandir(user_dir.path):
+                    name, suffix = os.path.splitext(entry.name)
+                    if suffix not in ('.mp4', '.webm', '.mkv', '.mp3') or not name.startswith(prefix):
+                        continue
+                    video_id = name[len(prefix):].split('_', 1)[0]
+                    if self.manifest.get(user_dir.name, video_id) is None:
+                        self.manifest.set(user_dir.name, video_id, entry.path,
+                                          added_at=entry.stat().st_mtime)
+                        added += 1
+        self.retention_indexed = True
+        self.save_config()
+        self.log_message(f"Indexed {added} existing downloads for retention")
+    
+    def retention_loop(self):
+        """Background retention: refresh the index, then enforce the limits"""
+        while not self.retention_stop.is_set():
+            try:
+                if self.retention_enabled():
+                    if not self.retention_indexed:
+                        self.index_existing_downloads()
+                    self.refresh_manifest()
+                    freed = self.enforce_retention()
+                    if freed:
+                        self.log_message(f"Retention freed {format_bytes(freed)}")
+            except Exception as e:
+                self.log_message(f"✗ Retention error: {str(e)}")
+            self.retention_stop.wait(max(1, float(self.retention_interval)) * 60)
+    
+    def start_retention(self):
+        """Start the background retention pass"""
+        if self.retention_thread is None:
+            self.retention_thread = threading.Thread(target=self.retention_loop, daemon=True)
+            self.retention_thread.start()
+    
+    def resume_interrupted(self):
+        """Finish the jobs a crash or forced exit left in the journal"""
+        leftover = self.postprocess_journal.pending()
+        if leftover:
+            self.log_message(f"Resuming post-processing for {len(leftover)} videos")
+            for item in leftover:
+                self.postprocessor.submit(*item)
+        
+        jobs = self.journal.pending()
+        if not jobs:
+            return
+        self.log_message(f"Resuming {len(jobs)} interrupted jobs")
+        
+        redownload = {}
+        for job in jobs:
+            username, video_id = job['username'], job['video_id']
+            
+            if job['state'] == 'converting':
+                input_path, output_path = job['input_path'], job['output_path']
+                if input_path and os.path.exists(input_path):
+                    # Throw away half-written output and redo the conversion from the original
+                    for partial in (output_path, self.conversion_temp_path(output_path)):
+                        if partial and partial != input_path and os.path.exists(partial):
+                            os.remove(partial)
+                    self.queue_conversion(username, video_id, job['conversion'])
+                elif output_path and os.path.exists(output_path):
+                    # The input is only removed after FFmpeg succeeds, so only the bookkeeping was cut short
+                    self.finish_conversion_job(username, video_id, True, output_path)
+                else:
+                    self.downloaded_videos.discard(job['hash'])
+                    job['state'] = 'queued'
+            elif job['state'] == 'downloaded':
+                self.downloaded_videos.add(job['hash'], username, video_id, job['title'])
+                self.queue_conversion(username, video_id, job['conversion'])
+            
+            if job['state'] in ('queued', 'downloading'):
+                redownload.setdefault(username, []).append(
+                    {'id': video_id, 'title': job['title'], 'hash': job['hash']})
+        
+        for username, videos in redownload.items():
+            user_folder = Path(self.download_folder) / username
+            user_folder.mkdir(parents=True, exist_ok=True)
+            self.download_batch(username, user_folder, videos)
+    
+    def import_metadata_sidecars(self, delete_sidecars: bool = False) -> int:
+        """Load existing .info.json sidecars into the metadata catalog
+        
+        Sidecars no newer than their catalog row are skipped, so running the
+        import again only reads what changed since the last run.
+        """
+        root = Path(self.download_folder)
+        if not root.is_dir():
+            return 0
+        
+        imported = 0
+        for user_dir in os.scandir(root):
+            if not user_dir.is_dir():
+                continue
+            username = user_dir.name
+            known = self.catalog.updated_at(username)
+            rows, sidecars = [], []
+            
+            for entry in os.scandir(user_dir.path):
+                if not entry.name.endswith('.info.json') or not entry.is_file():
+                    continue
+                try:
+                    # Files are named username_videoid_title, so most skips need no parsing
+                    if entry.name.startswith(f"{username}_"):
+                        video_id = entry.name[len(username) + 1:].split('_', 1)[0]
+                        if known.get(video_id, 0) >= entry.stat().st_mtime:
+                            sidecars.append(entry.path)
+                            continue
+                    with open(entry.path, 'r', encoding='utf-8') as f:
+                        info = json.load(f)
+                except (OSError, ValueError) as e:
+                    self.log_message(f"✗ Unreadable sidecar: {entry.name} - {str(e)}")
+                    continue
+                if not isinstance(info, dict) or not info.get('id'):
+                    continue
+                rows.append(self.catalog.make_row(username, pick_metadata(info)))
+                sidecars.append(entry.path)
+            
+            if rows:
+                self.catalog.add_many(rows)
+                imported += len(rows)
+            if delete_sidecars:
+                for path in sidecars:
+                    os.remove(path)
+        
+        self.log_message(f"✓ Imported {imported} metadata sidecars ({len(self.catalog)} videos in catalog)")
+        return imported
+    
+    def start_queue(self, workers: int = 0):
+        """Start the pool of job workers, picking up jobs left from the last run
+        
+        The pool has `queue_workers` threads, or `workers` if that is more;
+        calling again with a larger `workers` grows a running pool.
+        """
+        with self.state_lock:
+            if not self.queue_threads:
+                waiting = self.job_queue.restore()
+                if waiting:
+                    self.log_message(f"Resuming {waiting} queued downloads")
+            self.queue_workers = max(1, int(self.queue_workers))
+            while len(self.queue_threads) < max(self.queue_workers, workers):
+                thread = threading.Thread(target=self.queue_worker, daemon=True)
+                thread.start()
+                self.queue_threads.append(thread)
+    
+    def queue_worker(self):
+        """Run queued account jobs, highest priority first, until the queue stops"""
+        while True:
+            job = self.job_queue.take()
+            if job is None:
+                break
+            try:
+                self.download_videos(job['username'], incremental=bool(job['incremental']))
+            except Exception as e:
+                self.log_message(f"✗ Job error (@{job['username']}): {str(e)}")
+            finally:
+                self.job_queue.finish(job['id'])
+    
+    def enqueue_download(self, username: str, source: str = 'manual', incremental: bool = False) -> int:
+        """Queue a download of an account's new videos, returning the job ID"""
+        username = username.strip().replace('@', '')
+        job_id = self.job_queue.push(username, source, incremental)
+        if source == 'manual':
+            self.log_message(f"Queued @{username}")
+        self.start_queue()
+        return job_id
+    
+    def cancel_job(self, job_id: int) -> bool:
+        """Cancel a queued job"""
+        cancelled = self.job_queue.cancel(job_id)
+        self.log_message(f"Cancelled queued job {job_id}" if cancelled else
+                         f"✗ Job {job_id} is not queued (already running or finished)")
+        return cancelled
+    
+    def prioritise_job(self, job_id: int) -> bool:
+        """Move a queued job ahead of everything else in the queue"""
+        return self.job_queue.reprioritise(job_id, self.job_queue.first_priority() - 1)
+    
+    def get_monitor_accounts(self) -> Dict[str, int]:
+        """Collect monitored accounts and their check intervals in minutes"""
+        accounts = {}
+        
+        username = self.username.strip().replace('@', '')
+        if username:
+            accounts[username] = self.check_interval
+        
+        for line in self.monitored_accounts:
+            parts = line.split()
+            if not parts:
+                continue
+            interval = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else self.check_interval
+            accounts[parts[0].replace('@', '')] = max(1, interval)
+        return accounts
+    
+    def start_monitoring(self, accounts: Dict[str, int]):
+        """Start the monitor scheduler for accounts mapped to intervals in minutes"""
+        self.is_monitoring = True
+        for username, minutes in accounts.items():
+            self.log_message(f"Started monitoring @{username} every {minutes} minutes")
+        
+        # Start scheduler thread
+        self.max_concurrent_checks = max(1, int(self.max_concurrent_checks))
+        # Checks run as queue jobs, so give the queue a worker for every concurrent check
+        self.start_queue(self.max_concurrent_checks)
+        self.scheduler = MonitorScheduler(self.monitor_check, self.max_concurrent_checks, self.log_message,
+                                          metrics=self.metrics)
+        self.scheduler.set_accounts({username: minutes * 60 for username, minutes in accounts.items()})
+        self.monitor_thread = threading.Thread(target=self.scheduler.run)
+        self.monitor_thread.daemon = True
+        self.monitor_thread.start()
+        self.save_config()
+    
+    def stop_monitoring(self):
+        """Stop scheduling checks; checks already running finish on their own"""
+        self.is_monitoring = False
+        if self.scheduler:
+            self.scheduler.stop()
+        cancelled = self.job_queue.cancel_source('monitor')
+        self.log_message(f"Monitoring stopped ({cancelled} queued checks dropped)" if cancelled
+                         else "Monitoring stopped")
+    
+    def monitor_check(self, username: str):
+        """Scheduled unit of work for one monitored account
+        
+        The check goes through the job queue behind any manual downloads, and
+        the next one is scheduled only once it has finished.
+        """
+        if self.is_monitoring:
+            job_id = self.enqueue_download(username, 'monitor', incremental=self.incremental)
+            self.job_queue.wait(job_id)
+    
+    def load_config(self):
+        """Load configuration from file"""
+        try:
+            if os.path.exists(self.config_file):
+                with open(self.config_file, 'r') as f:
+                    config = json.load(f)
+                    self.username = config.get('username', self.username)
+                    self.download_folder = config.get('download_folder', self.download_folder)
+                    self.quality = config.get('quality', self.quality)
+                    self.conversion = config.get('conversion', self.conversion)
+                    self.limit = config.get('limit', self.limit)
+                    self.save_metadata = config.get('save_metadata', self.save_metadata)
+                    self.catalog_metadata = config.get('catalog_metadata', self.catalog_metadata)
+                    self.save_thumbnails = config.get('save_thumbnails', self.save_thumbnails)
+                    self.dedup_content = config.get('dedup_content', self.dedup_content)
+                    self.check_interval = config.get('check_interval', self.check_interval)
+                    self.bypass_ssl = config.get('bypass_ssl', self.bypass_ssl)
+                    self.max_workers = config.get('max_workers', self.max_workers)
+                    self.queue_workers = config.get('queue_workers', self.queue_workers)
+                    self.backend_name = config.get('backend', self.backend_name)
+                    self.incremental = config.get('incremental_listing', self.incremental)
+                    self.listing_idle_timeout = config.get('listing_idle_timeout', self.listing_idle_timeout)
+                    self.high_water_marks = config.get('high_water_marks', {})
+                    self.monitored_accounts = config.get('monitored_accounts', [])
+                    self.max_concurrent_checks = config.get('max_concurrent_checks', self.max_concurrent_checks)
+                    self.metrics_port = config.get('metrics_port', self.metrics_port)
+                    self.metrics_file = config.get('metrics_file', self.metrics_file)
+                    self.metrics_interval = config.get('metrics_interval', self.metrics_interval)
+                    self.tool_cache = config.get('tool_cache', self.tool_cache)
+                    self.batch_size = config.get('batch_size', self.batch_size)
+                    self.concurrent_fragments = config.get('concurrent_fragments', self.concurrent_fragments)
+                    thumbnails = config.get('thumbnails', {})
+                    self.thumbnail_mode = thumbnails.get('mode', self.thumbnail_mode)
+                    self.thumbnail_width = thumbnails.get('width', self.thumbnail_width)
+                    self.thumbnail_max_kb = thumbnails.get('max_kb', self.thumbnail_max_kb)
+                    self.thumbnail_cache_mb = thumbnails.get('cache_mb', self.thumbnail_cache_mb)
+                    retention = config.get('retention', {})
+                    self.retention_max_total_gb = retention.get('max_total_gb', self.retention_max_total_gb)
+                    self.retention_max_user_gb = retention.get('max_user_gb', self.retention_max_user_gb)
+                    self.retention_max_age_days = retention.get('max_age_days', self.retention_max_age_days)
+                    self.retention_keep_last = retention.get('keep_last', self.retention_keep_last)
+                    self.retention_order = retention.get('order', self.retention_order)
+                    self.min_free_gb = retention.get('min_free_gb', self.min_free_gb)
+                    self.retention_interval = retention.get('interval_minutes', self.retention_interval)
+                    self.retention_indexed = retention.get('indexed', self.retention_indexed)
+                
+                # One-time migration of the old JSON history into the download index;
+                # saving right away drops the list from the config file
+                legacy = config.get('downloaded_videos')
+                if legacy:
+                    added = self.downloaded_videos.import_hashes(legacy)
+                    self.log_message(f"Migrated {added} downloaded videos into {self.index_file}")
+                    self.save_config()
+        except Exception as e:
+            self.log_message(f"Error loading config: {str(e)}")
+    
+    def save_config(self):
+        """Save configuration to file"""
+        try:
+            with self.metrics.timer('tikstalk_save_config_seconds'), self.state_lock:
+                config = {
+                    'username': self.username,
+                    'download_folder': self.download_folder,
+                    'quality': self.quality,
+                    'conversion': self.conversion,
+                    'limit': self.limit,
+                    'save_metadata': self.save_metadata,
+                    'catalog_metadata': self.catalog_metadata,
+                    'save_thumbnails': self.save_thumbnails,
+                    'dedup_content': self.dedup_content,
+                    'check_interval': self.check_interval,
+                    'bypass_ssl': self.bypass_ssl,
+                    'max_workers': self.max_workers,
+                    'queue_workers': self.queue_workers,
+                    'backend': self.backend_name,
+                    'incremental_listing': self.incremental,
+                    'listing_idle_timeout': self.listing_idle_timeout,
+                    'high_water_marks': self.high_water_marks,
+                    'monitored_accounts': self.monitored_accounts,
+                    'max_concurrent_checks': self.max_concurrent_checks,
+                    'metrics_port': self.metrics_port,
+                    'metrics_file': self.metrics_file,
+                    'metrics_interval': self.metrics_interval,
+                    'tool_cache': self.tool_cache,
+                    'batch_size': self.batch_size,
+                    'concurrent_fragments': self.concurrent_fragments,
+                    'thumbnails': {
+                        'mode': self.thumbnail_mode,
+                        'width': self.thumbnail_width,
+                        'max_kb': self.thumbnail_max_kb,
+                        'cache_mb': self.thumbnail_cache_mb
+                    },
+                    'retention': {
+                        'max_total_gb': self.retention_max_total_gb,
+                        'max_user_gb': self.retention_max_user_gb,
+                        'max_age_days': self.retention_max_age_days,
+                        'keep_last': self.retention_keep_last,
+                        'order': self.retention_order,
+                        'min_free_gb': self.min_free_gb,
+                        'interval_minutes': self.retention_interval,
+                        'indexed': self.retention_indexed
+                    }
+                }
+                if not self.save_settings and os.path.exists(self.config_file):
+                    # One-off overrides stay out of the file; only state the engine learned is merged in
+                    with open(self.config_file, 'r') as f:
+                        saved = json.load(f)
+                    saved['high_water_marks'] = self.high_water_marks
+                    saved['tool_cache'] = self.tool_cache
+                    saved.setdefault('retention', {})['indexed'] = self.retention_indexed
+                    config = saved
+                with open(self.config_file, 'w') as f:
+                    json.dump(config, f, indent=2)
+        except Exception as e:
+            self.log_message(f"Error saving config: {str(e)}")
+    
+    def start_metrics(self):
+        """Publish metrics on the configured local port and/or snapshot file"""
+        if self.metrics_exporter or not (self.metrics_port or self.metrics_file):
+            return
+        try:
+            exporter = MetricsExporter(self.metrics, int(self.metrics_port), self.metrics_file,
+                                       self.metrics_interval, self.log_message)
+            exporter.start()
+        except (OSError, ValueError) as e:
+            self.log_message(f"✗ Could not start metrics: {str(e)}")
+            return
+        self.metrics_exporter = exporter
+        if self.metrics_port:
+            self.log_message(f"Metrics at http://127.0.0.1:{self.metrics_port}/metrics")
+        if self.metrics_file:
+            self.log_message(f"Writing metrics to {self.metrics_file} every {exporter.interval}s")
+    
+    def close(self):
+        """Stop background work and persist state"""
+        # Conversions cut short here stay in the journal and are redone on next start
+        self.closing = True
+        self.retention_stop.set()
+        self.job_queue.stop()
+        # Post-processing not yet started stays journaled and is redone on next start
+        dropped = self.postprocessor.cancel()
+        if dropped:
+            self.log_message(f"Left post-processing for {dropped} videos to the next start")
+        self.cancel_conversions()
+        self.save_config()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        self.downloaded_videos.close()
+        self.journal.close()
+        self.content_store.close()
+        self.manifest.close()
+        self.catalog.close()
+        self.job_queue.close()
+        self.thumbnails.close()
+        self.checkpoints.close()
+        self.postprocess_journal.close()
+        for handler in self.file_logger.handlers:
+            handler.close()